@@ -1,51 +1,83 @@
+import importlib
 import os
+import sys
 import streamlit as st
 from dotenv import load_dotenv
-import google.generativeai as genai
-from pages import Home, EDA, Model_Training, Prediction, About
-from utils.data_loader import load_data
-from utils.visualizations import plot_confusion_matrix
+from utils.instrumentation import profile_span, show_performance_panel
 
 st.set_page_config(page_title="Telco Churn ML Platform", page_icon="📊", layout="wide")
 
 load_dotenv()
 
+# Navigation label -> module under pages/. Modules are imported on first visit, so
+# Home and About never load sklearn, Plotly or scipy.
+PAGES = {
+    "Home": "Home",
+    "EDA": "EDA",
+    "Model Training": "Model_Training",
+    "Prediction": "Prediction",
+    "About": "About"
+}
+
+
+def load_page(label: str):
+    """Import a page module, timing the import the first time it happens in this process."""
+    module = f"pages.{PAGES[label]}"
+    if module in sys.modules:
+        return sys.modules[module]
+    with profile_span(f"import {module}", 'import'):
+        return importlib.import_module(module)
+
+
+@st.cache_resource(show_spinner=False)
+def gemini_model(api_key: str):
+    """Gemini client, created on the first question rather than on every rerun."""
+    with profile_span("import google.generativeai", 'import'):
+        import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel('gemini-2.0-flash')
+
+
 with st.sidebar:
     st.title("Telco ML Platform")
     st.markdown("---")
-    page = st.radio("Navigation", ["Home", "EDA", "Model Training", "Prediction", "About"])
+    page = st.radio("Navigation", list(PAGES))
     st.markdown("---")
     st.subheader("Settings")
     show_gemini = st.checkbox("Show AI Assistant", value=True)
+    st.checkbox("Compact Memory Mode", value=False, key='compact_mode',
+                help="Store low-cardinality columns as categories and downcast numbers to save memory. "
+                     "Decimals become float32, rounded to about 7 significant digits.")
+    st.checkbox("Typed Streaming Reads", value=False, key='streaming_mode',
+                help="Read CSVs in chunks with the Telco schema: Yes/No flags as booleans, categories and "
+                     "small numeric types from the start.")
+    st.checkbox("Performance Panel", value=False, key='show_performance',
+                help="Time data loading, preprocessing, training and plotting for this session, "
+                     "and show the memory held by the shared store.")
     st.markdown("---")
     st.caption("Upload a dataset in any page to get started.")
 
-df_global = None
 for key in ['model_results', 'preprocessor', 'label_encoder']:
     if key not in st.session_state:
         st.session_state[key] = None
 
-if page == "Home":
-    Home.show()
-elif page == "EDA":
-    EDA.show()
-elif page == "Model Training":
-    Model_Training.show()
-elif page == "Prediction":
-    Prediction.show()
-elif page == "About":
-    About.show()
+load_page(page).show()
 
 if show_gemini and 'GOOGLE_API_KEY' in os.environ:
     st.markdown("---")
     with st.expander("🤖 Gemini AI Assistant", expanded=False):
-        genai.configure(api_key=os.environ['GOOGLE_API_KEY'])
-        model = genai.GenerativeModel('gemini-2.0-flash')
         user_q = st.text_input("Ask about the data, models, or results:")
         if user_q:
             with st.spinner("Thinking..."):
                 try:
-                    response = model.generate_content(user_q)
+                    response = gemini_model(os.environ['GOOGLE_API_KEY']).generate_content(user_q)
                     st.write(response.text)
                 except Exception as e:
                     st.error(f"AI error: {str(e)}")
+
+if st.session_state.get('show_performance'):
+    with st.sidebar:
+        st.markdown("---")
+        show_performance_panel()
+        from utils.store import show_store_panel
+        show_store_panel()
@@ -0,0 +1,361 @@
+"""Benchmark the load -> preprocess -> train -> predict pipeline and app startup.
+
+    python -m benchmarks.bench run --sizes 10k 100k 1m
+    python -m benchmarks.bench compare            # last two runs
+    python -m benchmarks.bench compare BASE HEAD --threshold 0.1
+
+Every case runs in a fresh process, so ``peak_rss_mb`` is that case's own
+high-water mark (setup included; joblib worker processes are not counted).
+``wall_s`` is the best of ``--repeat`` timings. ``startup`` cases time a cold
+``import`` of each page module (Streamlit included) in a fresh interpreter;
+they do not depend on the data size and run once per run. ``matrix`` cases
+build the feature matrix in the default and the sparse-native mode and record
+its format, non-zeros and size next to its dense size, plus any densification
+caught by ``densify_guard`` while fitting a model on it. Runs are appended to a JSON
+history file (``cache/bench_history.json`` by default); ``compare`` flags cases
+whose wall time or peak RSS grew by more than the thresholds and exits non-zero
+if any did.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import pandas as pd
+import sklearn
+from utils.cache import CACHE_DIR
+
+
+# Runs are machine-specific, so the history stays out of the source tree (``--history`` overrides it).
+HISTORY_PATH = CACHE_DIR / 'bench_history.json'
+DEFAULT_SIZES = ['10k', '100k', '1m']
+STAGES = ['startup', 'load', 'preprocess', 'matrix', 'train', 'predict']
+STARTUP_MODULES = ['app', 'pages.Home', 'pages.EDA', 'pages.Model_Training', 'pages.Prediction']
+TRAIN_MODELS = ['Random Forest', 'Logistic Regression', 'Gradient Boosting', 'Hist Gradient Boosting', 'SVM', 'KNN',
+                'KNN (ANN)']
+# Models with a compiled fast path; prediction is timed through both paths.
+PREDICT_MODELS = ['Logistic Regression', 'Random Forest']
+# Training is capped near the bundled dataset's size: the grid searches do not scale
+# to 1M rows (SVM, and one-hot customerIDs make X as wide as it is long).
+TRAIN_MAX_ROWS = 5_000
+SINGLE_ROW_CALLS = 200
+
+
+def parse_size(text: str) -> int:
+    text = text.lower().replace('_', '')
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def _peak_rss_mb(children: bool = False) -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _timed(fn: Callable[[], Any], repeat: int, before: Optional[Callable[[], None]] = None) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _import_seconds(module: str) -> float:
+    """Wall time of importing ``module`` (and Streamlit) in a fresh interpreter."""
+    code = ("import time; start = time.perf_counter(); import importlib, streamlit; "
+            f"importlib.import_module({module!r}); print(time.perf_counter() - start)")
+    out = subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).resolve().parent.parent,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _load(path: Path, streaming: bool = False) -> pd.DataFrame:
+    from utils.data_loader import load_data
+    return load_data(str(path), streaming=streaming)
+
+
+def _train_sample(path: Path, train_rows: int):
+    from utils.preprocessing import preprocess_data
+    df = _load(path)
+    X, y, preprocessor, le = preprocess_data(df)
+    n = min(train_rows, len(y))
+    return df, X[:n], y[:n], preprocessor, le
+
+
+def run_case(case: str, path: str, n_rows: int, repeat: int, train_rows: int, cv: int) -> Dict[str, Any]:
+    """Run one case in this process and return its measurements."""
+    import warnings
+    warnings.simplefilter('ignore')
+    path = Path(path)
+    stage, _, rest = case.partition('/')
+    rows, extra = n_rows, {}
+    peak_rss = None
+
+    if stage == 'startup':
+        times = [_import_seconds(rest) for _ in range(repeat)]
+        rows = 1
+        peak_rss = _peak_rss_mb(children=True)
+    elif stage == 'load':
+        from utils.data_loader import load_data
+        times = _timed(lambda: _load(path, streaming=rest == 'typed'), repeat, before=load_data.clear)
+    elif stage == 'preprocess':
+        from utils.preprocessing import preprocess_data
+        df = _load(path)
+        rows = len(df)
+        times = _timed(lambda: preprocess_data(df), repeat)
+    elif stage == 'matrix':
+        from sklearn.linear_model import LogisticRegression
+        from utils.preprocessing import preprocess_data
+        from utils.sparsity import densify_guard, matrix_nbytes, dense_nbytes
+        df = _load(path)
+        rows, built = len(df), []
+        with densify_guard() as densified:
+            times = _timed(lambda: built.append(preprocess_data(df, sparse=rest == 'sparse')[:2]), repeat)
+            X, y = built[-1]
+            n = min(train_rows, len(y))
+            LogisticRegression(max_iter=200).fit(X[:n], y[:n])
+        nnz = X.nnz if hasattr(X, 'nnz') else int(np.count_nonzero(X))
+        extra.update(format=getattr(X, 'format', 'dense'), dtype=str(X.dtype), shape=list(X.shape), nnz=nnz,
+                     matrix_mb=matrix_nbytes(X) / 2 ** 20, dense_mb=dense_nbytes(X) / 2 ** 20,
+                     bytes_per_nnz=matrix_nbytes(X) / max(nnz, 1), densified=len(densified))
+    elif stage == 'train':
+        from models import trainer
+        df, X, y, _, _ = _train_sample(path, train_rows)
+        fn = getattr(trainer, f"train_{re.sub(r'[^a-z0-9]+', '_', rest.lower()).strip('_')}")
+        if rest == trainer.HIST_GB_NAME:
+            X = df.iloc[:len(y)]
+        rows = len(y)
+        times = _timed(lambda: fn(X, y, cv=cv), repeat)
+        extra['cv'] = cv
+    elif stage in ('predict_single', 'predict_batch'):
+        from sklearn.base import clone
+        from models.trainer import MODEL_SPECS
+        from models.fastpath import export_predictor
+        from utils.scoring import score_chunk, BATCH_CHUNK_SIZE
+        name, _, variant = rest.partition('/')
+        df, X, y, preprocessor, le = _train_sample(path, train_rows)
+        model = clone(MODEL_SPECS[name][0]).fit(X, y)
+        predictor = export_predictor(preprocessor, model) if variant == 'compiled' else None
+        if stage == 'predict_single':
+            frames = [df.iloc[[i]] for i in range(min(SINGLE_ROW_CALLS, len(df)))]
+            latencies = []
+
+            def score_rows():
+                for frame in frames:
+                    start = time.perf_counter()
+                    score_chunk(frame, preprocessor, model, le, predictor)
+                    latencies.append(time.perf_counter() - start)
+            times = _timed(score_rows, repeat)
+            rows = len(frames)
+            extra['p50_ms'], extra['p99_ms'] = (np.percentile(latencies, [50, 99]) * 1000).round(3).tolist()
+        else:
+            rows = len(df)
+            times = _timed(lambda: [score_chunk(df.iloc[i:i + BATCH_CHUNK_SIZE], preprocessor, model, le, predictor)
+                                    for i in range(0, len(df), BATCH_CHUNK_SIZE)], repeat)
+    else:
+        raise ValueError(f"Unknown case '{case}'.")
+
+    wall = min(times)
+    return {
+        'case': case,
+        'size': n_rows,
+        'rows': rows,
+        'wall_s': wall,
+        'times_s': times,
+        'throughput_rows_s': rows / wall if wall else None,
+        'peak_rss_mb': peak_rss or _peak_rss_mb(),
+        **extra
+    }
+
+
+def expand_cases(stages: List[str]) -> List[str]:
+    cases = []
+    for stage in stages:
+        if stage == 'startup':
+            cases += [f"startup/{module}" for module in STARTUP_MODULES]
+        elif stage == 'load':
+            cases += ['load/raw', 'load/typed']
+        elif stage == 'matrix':
+            cases += ['matrix/default', 'matrix/sparse']
+        elif stage == 'train':
+            cases += [f"train/{name}" for name in TRAIN_MODELS]
+        elif stage == 'predict':
+            cases += [f"{kind}/{name}/{variant}" for kind in ('predict_single', 'predict_batch')
+                      for name in PREDICT_MODELS for variant in ('sklearn', 'compiled')]
+        else:
+            cases.append(stage)
+    return cases
+
+
+def _git_commit() -> Dict[str, Any]:
+    root = Path(__file__).resolve().parent.parent
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def read_history(path: Path = HISTORY_PATH) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def append_history(run: Dict[str, Any], path: Path = HISTORY_PATH):
+    history = read_history(path) + [run]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp, path)
+
+
+def run(sizes: List[str], stages: List[str], repeat: int = 3, train_rows: int = TRAIN_MAX_ROWS, cv: int = 3,
+        label: Optional[str] = None, history: Path = HISTORY_PATH) -> Dict[str, Any]:
+    """Run every case at every size and append the run to ``history``."""
+    from benchmarks.synthetic import telco_csv
+    git = _git_commit()
+    started = datetime.now(timezone.utc)
+    record = {
+        'id': f"{started:%Y%m%dT%H%M%S}-{(git['commit'] or 'nogit')[:7]}",
+        'timestamp': started.isoformat(),
+        'label': label,
+        **git,
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sklearn': sklearn.__version__
+        },
+        'options': {'repeat': repeat, 'train_rows': train_rows, 'cv': cv},
+        'results': []
+    }
+    spawn = multiprocessing.get_context('spawn')
+    for i, size in enumerate(sizes):
+        n_rows = parse_size(size)
+        path = telco_csv(n_rows)
+        for case in expand_cases(stages):
+            if case.startswith('startup/') and i > 0:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                try:
+                    result = pool.submit(run_case, case, str(path), n_rows, repeat, train_rows, cv).result()
+                except Exception as e:
+                    result = {'case': case, 'size': n_rows, 'error': str(e)}
+            record['results'].append(result)
+            if 'error' in result:
+                print(f"{size:>6}  {case:<45} ERROR {result['error']}", flush=True)
+            else:
+                print(f"{size:>6}  {case:<45} {result['wall_s']:9.3f}s  {result['throughput_rows_s'] or 0:>12,.1f} rows/s"
+                      f"  {result['peak_rss_mb'] or float('nan'):8.0f} MB"
+                      + (f"  X {result['format']} {result['dtype']} {result['matrix_mb']:.1f} MB"
+                         f" ({result['bytes_per_nnz']:.1f} B/nnz, dense {result['dense_mb']:,.0f} MB,"
+                         f" {result['densified']} densified)" if 'matrix_mb' in result else ''), flush=True)
+    append_history(record, history)
+    print(f"Recorded run {record['id']} in {history}")
+    return record
+
+
+def _select(history: List[Dict[str, Any]], ref: str) -> Dict[str, Any]:
+    """A run by id (or id prefix), or by list index such as ``-1``."""
+    try:
+        return history[int(ref)]
+    except (ValueError, IndexError):
+        pass
+    matches = [r for r in history if r['id'].startswith(ref)]
+    if len(matches) != 1:
+        raise SystemExit(f"No unique run matches '{ref}'.")
+    return matches[0]
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float = 0.10,
+            rss_threshold: float = 0.20) -> List[Dict[str, Any]]:
+    """Per-case wall-time and peak-RSS ratios of ``head`` over ``base``."""
+    base_results = {(r['case'], r['size']): r for r in base['results'] if 'error' not in r}
+    rows = []
+    for r in head['results']:
+        b = base_results.get((r['case'], r['size']))
+        if b is None or 'error' in r:
+            continue
+        time_ratio = r['wall_s'] / b['wall_s'] if b['wall_s'] else float('nan')
+        rss_ratio = r['peak_rss_mb'] / b['peak_rss_mb'] if r.get('peak_rss_mb') and b.get('peak_rss_mb') else float('nan')
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append('SLOWER')
+        if rss_ratio > 1 + rss_threshold:
+            flags.append('MORE MEMORY')
+        if not flags and time_ratio < 1 - threshold:
+            flags.append('faster')
+        rows.append({'case': r['case'], 'size': r['size'], 'base_s': b['wall_s'], 'head_s': r['wall_s'],
+                     'time_ratio': time_ratio, 'rss_ratio': rss_ratio, 'flags': flags,
+                     'regression': any(f.isupper() for f in flags)})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=Path, default=HISTORY_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the suite and append it to the history")
+    run_parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES)
+    run_parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--train-rows', type=int, default=TRAIN_MAX_ROWS)
+    run_parser.add_argument('--cv', type=int, default=3)
+    run_parser.add_argument('--label')
+
+    compare_parser = commands.add_parser('compare', help="flag regressions between two recorded runs")
+    compare_parser.add_argument('base', nargs='?', default='-2')
+    compare_parser.add_argument('head', nargs='?', default='-1')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help="allowed wall-time growth")
+    compare_parser.add_argument('--rss-threshold', type=float, default=0.20, help="allowed peak-RSS growth")
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args.sizes, args.stages, args.repeat, args.train_rows, args.cv, args.label, args.history)
+        return 0
+
+    history = read_history(args.history)
+    if len(history) < 2 and (args.base, args.head) == ('-2', '-1'):
+        raise SystemExit("Need at least two recorded runs to compare.")
+    base, head = _select(history, args.base), _select(history, args.head)
+    rows = compare(base, head, args.threshold, args.rss_threshold)
+    print(f"base {base['id']} ({base.get('label') or '-'})  ->  head {head['id']} ({head.get('label') or '-'})")
+    for row in rows:
+        print(f"{row['size']:>8}  {row['case']:<45} {row['base_s']:9.3f}s -> {row['head_s']:9.3f}s"
+              f"  x{row['time_ratio']:.2f} time  x{row['rss_ratio']:.2f} rss  {' '.join(row['flags'])}")
+    regressions = sum(row['regression'] for row in rows)
+    print(f"{regressions} regression(s) in {len(rows)} compared case(s).")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
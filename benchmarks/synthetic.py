@@ -0,0 +1,45 @@
+# Synthetic Telco data
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import pandas as pd
+from utils.data_loader import DEFAULT_DATA_PATH
+
+
+DATA_DIR = Path(__file__).parent / 'data'
+
+
+def make_telco(n_rows: int, seed: int = 42, template: Path = DEFAULT_DATA_PATH) -> pd.DataFrame:
+    """Generate ``n_rows`` customers with the schema and value mix of ``template``.
+
+    Whole template rows are resampled, so the joint distribution (and with it
+    the churn signal) is kept; tenure and charges are jittered and every row
+    gets a fresh ``customerID``, as real data of that size would have.
+    """
+    rng = np.random.RandomState(seed)
+    base = pd.read_csv(template)
+    df = base.iloc[rng.randint(len(base), size=n_rows)].reset_index(drop=True)
+
+    digits = rng.randint(10_000, size=n_rows)
+    letters = rng.randint(ord('A'), ord('Z') + 1, size=(n_rows, 5)).astype(np.uint8).view('S5').ravel()
+    df['customerID'] = [f"{d:04d}-{s.decode()}" for d, s in zip(digits, letters)]
+
+    tenure = np.clip(df['tenure'] + rng.randint(-2, 3, size=n_rows), 0, base['tenure'].max())
+    monthly = (df['MonthlyCharges'] * rng.normal(1, 0.03, size=n_rows)).round(2)
+    total = (monthly * np.maximum(tenure, 1) * rng.normal(1, 0.05, size=n_rows)).round(2)
+    df['tenure'] = tenure
+    df['MonthlyCharges'] = monthly
+    # Keep the template's missing TotalCharges rows missing.
+    df['TotalCharges'] = total.where(df['TotalCharges'].notna())
+    return df
+
+
+def telco_csv(n_rows: int, seed: int = 42, data_dir: Optional[Path] = None) -> Path:
+    """Path to a generated CSV of ``n_rows`` customers, written on first use."""
+    path = Path(data_dir or DATA_DIR) / f"telco_{n_rows}_{seed}.csv"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        make_telco(n_rows, seed).to_csv(tmp, index=False)
+        tmp.replace(path)
+    return path
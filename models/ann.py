@@ -0,0 +1,138 @@
+"""Approximate KNN classifier over an IVF index of randomly projected features."""
+from typing import Optional, Tuple
+import numpy as np
+from scipy.sparse import issparse
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn.neighbors import NearestNeighbors
+from sklearn.random_projection import SparseRandomProjection
+from utils.cache import LRUCache, bytes_fingerprint
+
+
+# Indexes depend only on the training rows, so CV candidates on one worker share one per fold.
+_INDEXES = LRUCache(maxsize=8)
+
+
+def _fingerprint(X) -> str:
+    if issparse(X):
+        X = X.tocsr()
+        return bytes_fingerprint(X.data.tobytes() + X.indices.tobytes() + X.indptr.tobytes() + bytes(str(X.shape), 'ascii'))
+    return bytes_fingerprint(np.ascontiguousarray(X).tobytes() + bytes(str(X.shape), 'ascii'))
+
+
+class IVFIndex:
+    """Projection, centroids and training rows grouped by inverted list."""
+
+    def __init__(self, X, n_components: int, n_lists: Optional[int], random_state: Optional[int]):
+        n_samples = X.shape[0]
+        # Achlioptas density: the default, sparser projection loses too many neighbours on one-hot data.
+        self.projection = SparseRandomProjection(n_components=min(n_components, X.shape[1]), density=1 / 3,
+                                                 dense_output=True, random_state=random_state).fit(X)
+        points = self.project(X)
+        n_lists = n_lists or max(1, int(np.sqrt(n_samples)))
+        kmeans = MiniBatchKMeans(n_clusters=min(n_lists, n_samples), n_init=1, batch_size=1024,
+                                 random_state=random_state).fit(points)
+        self.centroids = kmeans.cluster_centers_.astype(np.float32)
+        assignment = kmeans.labels_
+        # Rows sorted by list: list l holds order[offsets[l]:offsets[l + 1]].
+        self.order = np.argsort(assignment, kind='stable')
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(self.centroids)))])
+        self.points = points[self.order]
+        self.sq_norms = np.einsum('ij,ij->i', self.points, self.points)
+
+    def project(self, X) -> np.ndarray:
+        return np.asarray(self.projection.transform(X), dtype=np.float32)
+
+    def search(self, Q: np.ndarray, k: int, n_probe: int) -> Tuple[np.ndarray, np.ndarray]:
+        """``(distances, indices)`` of the approximate ``k`` nearest training rows of each projected query."""
+        n_q = len(Q)
+        best_d = np.full((n_q, k), np.inf, dtype=np.float32)
+        best_i = np.full((n_q, k), -1, dtype=np.int64)
+        q_norms = np.einsum('ij,ij->i', Q, Q)
+        to_centroids = q_norms[:, None] - 2 * Q @ self.centroids.T + np.einsum('ij,ij->i', self.centroids, self.centroids)
+        n_probe = min(n_probe, len(self.centroids))
+        probes = np.argpartition(to_centroids, n_probe - 1, axis=1)[:, :n_probe] if n_probe < len(self.centroids) \
+            else np.broadcast_to(np.arange(len(self.centroids)), (n_q, n_probe))
+        for lst in np.unique(probes):
+            start, end = self.offsets[lst], self.offsets[lst + 1]
+            if start == end:
+                continue
+            rows = np.flatnonzero((probes == lst).any(axis=1))
+            d = q_norms[rows, None] - 2 * Q[rows] @ self.points[start:end].T + self.sq_norms[start:end]
+            merged_d = np.concatenate([best_d[rows], d], axis=1)
+            merged_i = np.concatenate([best_i[rows], np.broadcast_to(np.arange(start, end), d.shape)], axis=1)
+            keep = np.argpartition(merged_d, k - 1, axis=1)[:, :k] if merged_d.shape[1] > k \
+                else np.broadcast_to(np.arange(merged_d.shape[1]), merged_d.shape)
+            best_d[rows] = np.take_along_axis(merged_d, keep, axis=1)
+            best_i[rows] = np.take_along_axis(merged_i, keep, axis=1)
+        found = best_i >= 0
+        return best_d, np.where(found, self.order[np.maximum(best_i, 0)], -1)
+
+
+class ApproxKNNClassifier(ClassifierMixin, BaseEstimator):
+    """Uniform-weight KNN voting over an ``IVFIndex``.
+
+    Queries are compared only with the rows in their ``n_probe`` nearest lists,
+    ``batch_size`` queries per matrix product. ``n_probe`` trades recall for speed: probing every list is an exact search
+    in the projected space.
+    """
+
+    def __init__(self, n_neighbors: int = 5, n_components: int = 128, n_lists: Optional[int] = None,
+                 n_probe: int = 4, batch_size: int = 2048, random_state: Optional[int] = None):
+        self.n_neighbors = n_neighbors
+        self.n_components = n_components
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.batch_size = batch_size
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        key = (_fingerprint(X), self.n_components, self.n_lists, self.random_state)
+        index = _INDEXES.get(key)
+        if index is None:
+            index = IVFIndex(X, self.n_components, self.n_lists, self.random_state)
+            _INDEXES.put(key, index)
+        self.index_ = index
+        self.classes_, self._y = np.unique(np.asarray(y), return_inverse=True)
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def kneighbors(self, X, n_neighbors: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Squared projected distances and training-row indices, ``batch_size`` queries at a time."""
+        k = n_neighbors or self.n_neighbors
+        out_d, out_i = [], []
+        for start in range(0, X.shape[0], self.batch_size):
+            d, i = self.index_.search(self.index_.project(X[start:start + self.batch_size]), k, self.n_probe)
+            order = np.argsort(d, axis=1)
+            out_d.append(np.take_along_axis(d, order, axis=1))
+            out_i.append(np.take_along_axis(i, order, axis=1))
+        return np.vstack(out_d), np.vstack(out_i)
+
+    def predict_proba(self, X) -> np.ndarray:
+        _, neighbors = self.kneighbors(X)
+        labels = np.where(neighbors >= 0, self._y[np.maximum(neighbors, 0)], -1)
+        counts = np.stack([(labels == c).sum(axis=1) for c in range(len(self.classes_))], axis=1)
+        return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def recall(self, X, n_queries: int = 500, random_state: int = 0) -> float:
+        """Recall@k against an exact brute-force search of ``X`` (the training data) in its original space.
+
+        Queries are training rows, so each row itself is left out of both
+        searches. One-hot features put many rows at the same distance, so a
+        returned neighbour counts as a hit when it is no farther than the exact
+        k-th neighbour.
+        """
+        k = self.n_neighbors
+        rng = np.random.RandomState(random_state)
+        queries = rng.choice(X.shape[0], min(n_queries, X.shape[0]), replace=False)
+        exact_d, _ = NearestNeighbors(n_neighbors=k + 1, algorithm='brute').fit(X).kneighbors(X[queries])
+        _, approx = self.kneighbors(X[queries], k + 1)
+        hits = 0
+        for q, radius, a in zip(queries, exact_d[:, -1], approx):
+            a = a[(a != q) & (a >= 0)][:k]
+            hits += int((euclidean_distances(X[[q]], X[a])[0] <= radius + 1e-6).sum())
+        return hits / (k * len(queries))
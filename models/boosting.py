@@ -0,0 +1,37 @@
+# Histogram gradient boosting
+from typing import Any, Dict, Tuple
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.model_selection import train_test_split
+
+
+HIST_GB_GRID = {'learning_rate': [0.05, 0.1], 'max_leaf_nodes': [15, 31], 'l2_regularization': [0.0, 1.0]}
+
+
+class EarlyStoppingHistGB(HistGradientBoostingClassifier):
+    """``HistGradientBoostingClassifier`` that holds out its own early-stopping split.
+
+    sklearn stratifies the validation split and fails when a class has a single
+    row (the bundled data has one unlabelled customer). Here such rows always
+    stay in training; the rest are split stratified by ``validation_fraction``.
+    """
+
+    def fit(self, X, y, sample_weight=None):
+        y = np.asarray(y)
+        if not self.early_stopping or self.validation_fraction is None:
+            return super().fit(X, y, sample_weight)
+        _, inverse, counts = np.unique(y, return_inverse=True, return_counts=True)
+        splittable = counts[inverse] >= 2
+        train, val = train_test_split(np.flatnonzero(splittable), test_size=self.validation_fraction,
+                                      stratify=y[splittable], random_state=self.random_state)
+        train = np.concatenate([train, np.flatnonzero(~splittable)])
+        weights = {} if sample_weight is None else {'sample_weight': np.asarray(sample_weight)[train],
+                                                    'sample_weight_val': np.asarray(sample_weight)[val]}
+        return super().fit(X[train], y[train], X_val=X[val], y_val=y[val], **weights)
+
+
+def hist_gb_spec(categorical_mask: np.ndarray) -> Tuple[Any, Dict[str, list]]:
+    """Sweep spec over ``preprocess_ordinal`` features, with their categorical columns native."""
+    estimator = EarlyStoppingHistGB(categorical_features=categorical_mask, max_iter=500, early_stopping=True,
+                                    validation_fraction=0.1, n_iter_no_change=10, random_state=42)
+    return estimator, HIST_GB_GRID
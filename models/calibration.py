@@ -0,0 +1,148 @@
+# Probability calibration
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from scipy.optimize import minimize
+from scipy.special import expit, log_expit
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.isotonic import IsotonicRegression
+from sklearn.model_selection import train_test_split
+from sklearn.utils import _safe_indexing
+from utils.cache import LRUCache, bytes_fingerprint
+
+
+CALIBRATION_METHODS = ['sigmoid', 'isotonic']
+CALIBRATION_FRACTION = 0.2
+# Isotonic regression overfits classes with fewer held-out positives; they use Platt scaling.
+MIN_ISOTONIC_POSITIVES = 20
+
+_SPLITS = LRUCache(maxsize=8)
+
+
+def calibration_split(y, fraction: float = CALIBRATION_FRACTION, random_state: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """``(train, held_out)`` row indices, stratified by ``y`` and memoized on its content.
+
+    Every model calibrated on the same labels shares one split. Rows of classes
+    with a single member always stay in training (see ``EarlyStoppingHistGB``).
+    """
+    y = np.asarray(y)
+    key = (bytes_fingerprint(y.tobytes()), str(y.dtype), fraction, random_state)
+    split = _SPLITS.get(key)
+    if split is None:
+        _, inverse, counts = np.unique(y, return_inverse=True, return_counts=True)
+        splittable = counts[inverse] >= 2
+        train, held_out = train_test_split(np.flatnonzero(splittable), test_size=fraction,
+                                           stratify=y[splittable], random_state=random_state)
+        split = np.sort(np.concatenate([train, np.flatnonzero(~splittable)])), np.sort(held_out)
+        _SPLITS.put(key, split)
+    return split
+
+
+class SigmoidCalibrator:
+    """Platt scaling: ``p = 1 / (1 + exp(-(a * score + b)))`` fitted on smoothed targets."""
+
+    def fit(self, scores: np.ndarray, target: np.ndarray) -> 'SigmoidCalibrator':
+        n_pos = target.sum()
+        # Platt's targets keep a separable held-out set from pushing ``a`` to infinity.
+        t = np.where(target, (n_pos + 1) / (n_pos + 2), 1 / (len(target) - n_pos + 2))
+
+        def loss(ab):
+            z = ab[0] * scores + ab[1]
+            grad = expit(z) - t
+            return -(t * log_expit(z) + (1 - t) * log_expit(-z)).sum(), np.array([grad @ scores, grad.sum()])
+
+        prior = np.log((n_pos + 1) / (len(target) - n_pos + 1))
+        self.a_, self.b_ = minimize(loss, np.array([0.0, prior]), jac=True, method='L-BFGS-B').x
+        return self
+
+    def predict(self, scores: np.ndarray) -> np.ndarray:
+        return expit(self.a_ * scores + self.b_)
+
+
+def _calibrator(method: str):
+    if method == 'sigmoid':
+        return SigmoidCalibrator()
+    if method == 'isotonic':
+        return IsotonicRegression(y_min=0, y_max=1, out_of_bounds='clip')
+    raise ValueError(f"Unknown calibration method '{method}'. Use one of {CALIBRATION_METHODS}.")
+
+
+def _scores(model, X) -> np.ndarray:
+    """Per-class scores, ``(n, n_classes)``; a binary decision function gives one column."""
+    if hasattr(model, 'decision_function'):
+        scores = model.decision_function(X)
+    else:
+        scores = model.predict_proba(X)
+        scores = scores[:, 1:] if scores.shape[1] == 2 else scores
+    return scores.reshape(len(scores), -1)
+
+
+class CalibratedClassifier(ClassifierMixin, BaseEstimator):
+    """Calibrated probabilities for any classifier, from one held-out split.
+
+    ``estimator`` is fitted once on the training part of ``calibration_split``.
+    Its decision function (or uncalibrated ``predict_proba``) on the held-out
+    rows fits one calibrator per class: Platt ``'sigmoid'`` or ``'isotonic'``.
+    The model that predicts is then refitted on all rows, like
+    ``CalibratedClassifierCV(ensemble=False)`` with a single split instead of
+    cross-validation. Multiclass probabilities are normalised one-vs-rest.
+    A class absent from the held-out rows gets probability zero, and one with
+    fewer than ``MIN_ISOTONIC_POSITIVES`` held-out rows is fitted with Platt
+    scaling even when ``method='isotonic'``.
+    """
+
+    def __init__(self, estimator=None, method: str = 'sigmoid', calibration_fraction: float = CALIBRATION_FRACTION,
+                 random_state: int = 42):
+        self.estimator = estimator
+        self.method = method
+        self.calibration_fraction = calibration_fraction
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        return self._calibrate(clone(self.estimator).fit(X, y), X, y)
+
+    @classmethod
+    def from_fitted(cls, model, X, y, method: str = 'sigmoid', **params) -> 'CalibratedClassifier':
+        """Calibrate ``model``, already fitted on ``X``/``y``, without refitting it on all rows."""
+        return cls(clone(model), method, **params)._calibrate(model, X, y)
+
+    def _calibrate(self, model, X, y):
+        y = np.asarray(y)
+        train, held_out = calibration_split(y, self.calibration_fraction, self.random_state)
+        held_out_model = clone(self.estimator).fit(_safe_indexing(X, train), y[train])
+        scores, y_held_out = _scores(held_out_model, _safe_indexing(X, held_out)), y[held_out]
+        self.estimator_, self.classes_ = model, model.classes_
+        positive = self.classes_[1:] if scores.shape[1] == 1 else self.classes_
+        self.calibrators_ = []
+        for k, cls in enumerate(positive):
+            target = y_held_out == cls
+            if target.all() or not target.any():
+                self.calibrators_.append(float(target.any()))
+            else:
+                method = 'sigmoid' if target.sum() < MIN_ISOTONIC_POSITIVES else self.method
+                self.calibrators_.append(_calibrator(method).fit(scores[:, k], target))
+        self.n_held_out_ = len(held_out)
+        return self
+
+    def predict_proba(self, X) -> np.ndarray:
+        scores = _scores(self.estimator_, X)
+        proba = np.column_stack([np.full(len(scores), c) if isinstance(c, float) else c.predict(scores[:, k])
+                                 for k, c in enumerate(self.calibrators_)])
+        if proba.shape[1] == 1:
+            return np.hstack([1 - proba, proba])
+        total = proba.sum(axis=1, keepdims=True)
+        return np.divide(proba, total, out=np.full_like(proba, 1 / proba.shape[1]), where=total > 0)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def base_model(model):
+    """The estimator inside a ``CalibratedClassifier`` (for feature importances and the like)."""
+    return model.estimator_ if isinstance(model, CalibratedClassifier) else model
+
+
+def calibration_info(model) -> Optional[Dict[str, Any]]:
+    """Method and held-out rows of a calibrated model, for result dicts and the UI."""
+    if not isinstance(model, CalibratedClassifier):
+        return None
+    return {'method': model.method, 'held_out_rows': model.n_held_out_}
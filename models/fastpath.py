@@ -0,0 +1,319 @@
+# Compiled inference
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+from scipy.sparse import csr_matrix
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from utils.cache import LRUCache
+
+
+PARITY_ATOL = 1e-6
+PROBE_ROWS = 1024
+# Frames up to this many rows are encoded with plain Python instead of vectorised pandas.
+SMALL_FRAME_ROWS = 64
+# Rows per traversal block; bounds the (rows x trees) index arrays of a forest.
+TREE_BLOCK_ROWS = 1024
+# Past this many rows sklearn's compiled tree walk beats NumPy's level-by-level
+# one, so forests are fed the directly built sparse matrix instead.
+TREE_NUMPY_MAX_ROWS = 384
+
+_PREDICTORS = LRUCache(maxsize=16)
+
+
+def _fits_float32(dtype) -> bool:
+    """Whether numpy would compute a column of ``dtype`` in float32 alongside float32 columns."""
+    dtype = getattr(dtype, 'numpy_dtype', dtype)
+    return isinstance(dtype, np.dtype) and (dtype.kind in 'iub' and dtype.itemsize <= 2 or dtype == np.float32)
+
+
+def _steps(transformer) -> Dict[str, Any]:
+    if not isinstance(transformer, Pipeline):
+        raise TypeError(f"Unsupported transformer {type(transformer).__name__}.")
+    return {type(step).__name__: step for _, step in transformer.steps}
+
+
+class CompiledTransform:
+    """The fitted ``preprocess_data`` ColumnTransformer as plain lookup tables.
+
+    Numeric columns become an ``(n, n_num)`` float array (imputed, not scaled)
+    and categorical columns an ``(n, n_cat)`` array of one-hot positions, with
+    -1 for categories the encoder ignores.
+    """
+
+    def __init__(self, preprocessor: ColumnTransformer):
+        if not isinstance(preprocessor, ColumnTransformer):
+            raise TypeError("Expected a fitted ColumnTransformer.")
+        self.columns = list(preprocessor.feature_names_in_)
+        self.numeric_cols, self.categorical_cols, self.categories = [], [], []
+        self.num_offset = self.cat_offset = 0
+        self.medians = self.mean = self.scale = np.zeros(0)
+        self.fill_value = 'missing'
+        self._lookups = LRUCache(maxsize=64)
+        self._positions = LRUCache(maxsize=64)
+        for name, transformer, cols in preprocessor.transformers_:
+            if isinstance(transformer, str) or len(cols) == 0:
+                continue
+            steps = _steps(transformer)
+            offset = preprocessor.output_indices_[name].start
+            if set(steps) == {'SimpleImputer', 'StandardScaler'}:
+                scaler = steps['StandardScaler']
+                self.numeric_cols, self.num_offset = list(cols), offset
+                self.medians = steps['SimpleImputer'].statistics_.astype(np.float64)
+                self.mean = scaler.mean_ if scaler.with_mean else np.zeros(len(cols))
+                self.scale = scaler.scale_ if scaler.with_std else np.ones(len(cols))
+            elif set(steps) == {'FunctionTransformer', 'SimpleImputer', 'OneHotEncoder'}:
+                onehot = steps['OneHotEncoder']
+                if onehot.drop_idx_ is not None or getattr(onehot, 'infrequent_categories_', None) is not None \
+                        and any(c is not None for c in onehot.infrequent_categories_):
+                    raise TypeError("Dropped or infrequent one-hot categories are not supported.")
+                self.categorical_cols, self.cat_offset = list(cols), offset
+                self.fill_value = steps['SimpleImputer'].fill_value
+                self.categories = [pd.Index(c) for c in onehot.categories_]
+            else:
+                raise TypeError(f"Unsupported pipeline {list(steps)} for '{name}'.")
+        self.level_offsets = np.cumsum([0] + [len(c) for c in self.categories])[:-1]
+        self.n_features = len(preprocessor.get_feature_names_out())
+
+    def transform(self, frame: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(numeric, codes)`` for the raw feature columns of ``frame``.
+
+        ``numeric`` keeps the float precision sklearn would compute in: float32
+        when every numeric column fits in it (compact frames), else float64.
+        """
+        if frame.attrs:
+            # pandas deep-copies attrs into every selected column.
+            frame = frame.copy(deep=False)
+            frame.attrs = {}
+        dtypes = [frame[col].dtype if col in frame else np.dtype(np.float64) for col in self.numeric_cols]
+        dtype = np.float32 if all(_fits_float32(d) for d in dtypes) and dtypes else np.float64
+        numeric = np.empty((len(frame), len(self.numeric_cols)), dtype=dtype)
+        for i, col in enumerate(self.numeric_cols):
+            values = frame[col] if col in frame else pd.Series(np.nan, index=frame.index)
+            if not is_numeric_dtype(values.dtype):
+                values = pd.to_numeric(values, errors='coerce')
+            values = values.to_numpy(dtype=dtype, na_value=np.nan)
+            numeric[:, i] = np.where(np.isnan(values), self.medians[i], values)
+        codes = np.empty((len(frame), len(self.categorical_cols)), dtype=np.int64)
+        for i, col in enumerate(self.categorical_cols):
+            codes[:, i] = self._encode(i, frame[col] if col in frame else pd.Series(None, index=frame.index, dtype=object))
+        return numeric, codes
+
+    def _encode(self, i: int, values: pd.Series) -> np.ndarray:
+        """One-hot positions of ``values`` in the same string form as
+        ``utils.preprocessing._as_str`` followed by the constant imputer."""
+        categories = self.categories[i]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            key = (i, values.dtype)
+            lookup = self._lookups.get(key)
+            if lookup is None:
+                # Trailing slot: the position for missing values (category code -1).
+                lookup = np.append(categories.get_indexer(values.cat.categories.astype(str)),
+                                   categories.get_indexer([self.fill_value]))
+                self._lookups.put(key, lookup)
+            return lookup[values.cat.codes.to_numpy()]
+        if len(values) <= SMALL_FRAME_ROWS:
+            positions = self._positions.get(i)
+            if positions is None:
+                positions = dict(zip(categories, range(len(categories))))
+                self._positions.put(i, positions)
+            fill = positions.get(self.fill_value, -1)
+            return np.array([fill if pd.isna(v) else positions.get(str(v), -1) for v in values.tolist()],
+                            dtype=np.int64)
+        strings = values.astype(str).where(values.notna(), self.fill_value)
+        return categories.get_indexer(strings)
+
+    def scaled(self, numeric: np.ndarray) -> np.ndarray:
+        """Standardise ``numeric`` exactly as the fitted StandardScaler would,
+        which works in the input's precision."""
+        dtype = numeric.dtype
+        return (numeric - self.mean.astype(dtype)) / self.scale.astype(dtype)
+
+    def to_sparse(self, numeric: np.ndarray, codes: np.ndarray) -> csr_matrix:
+        """The preprocessor's output matrix, built directly from ``transform``'s arrays."""
+        n_rows, n_num = numeric.shape
+        rows = np.repeat(np.arange(n_rows), n_num + codes.shape[1])
+        cols = np.hstack([np.broadcast_to(self.num_offset + np.arange(n_num), (n_rows, n_num)),
+                          self.cat_offset + self.level_offsets + codes]).ravel()
+        data = np.hstack([self.scaled(numeric), np.ones(codes.shape)]).ravel()
+        keep = np.hstack([np.ones((n_rows, n_num), dtype=bool), codes >= 0]).ravel()
+        return csr_matrix((data[keep], (rows[keep], cols[keep])), shape=(n_rows, self.n_features))
+
+    def feature_source(self, feature: int) -> Tuple[bool, int, int]:
+        """Map an output column to ``(is_numeric, source column, category position)``."""
+        if self.numeric_cols and self.num_offset <= feature < self.num_offset + len(self.numeric_cols):
+            return True, feature - self.num_offset, -1
+        position = feature - self.cat_offset
+        column = int(np.searchsorted(self.level_offsets, position, side='right') - 1)
+        return False, column, int(position - self.level_offsets[column])
+
+
+class CompiledLinear:
+    """Logistic regression with the scaler folded into the numeric weights and
+    one lookup table of one-hot weights per categorical column."""
+
+    def __init__(self, model: LogisticRegression, transform: CompiledTransform):
+        coef = model.coef_.T
+        n_num = len(transform.numeric_cols)
+        num_coef = coef[transform.num_offset:transform.num_offset + n_num]
+        self.num_weights = num_coef / transform.scale[:, None]
+        self.intercept = model.intercept_ - transform.mean @ self.num_weights
+        # One zero row per table: a -1 (ignored) category code indexes it.
+        self.tables = []
+        for i, categories in enumerate(transform.categories):
+            start = transform.cat_offset + transform.level_offsets[i]
+            self.tables.append(np.vstack([coef[start:start + len(categories)], np.zeros((1, coef.shape[1]))]))
+
+    def predict_proba(self, numeric: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        z = numeric @ self.num_weights + self.intercept
+        for i, table in enumerate(self.tables):
+            z += table[codes[:, i]]
+        if z.shape[1] == 1:
+            p = 1 / (1 + np.exp(-z[:, 0]))
+            return np.column_stack([1 - p, p])
+        z = np.exp(z - z.max(axis=1, keepdims=True))
+        return z / z.sum(axis=1, keepdims=True)
+
+
+class CompiledForest:
+    """Every tree of a random forest flattened into shared node arrays.
+
+    Nodes test raw columns rather than one-hot features: a node goes right when
+    ``lo < value <= hi``, which is ``(threshold, inf]`` on a scaled numeric
+    column and ``(k - 0.5, k + 0.5]`` (``code == k``) on a categorical one.
+    All trees are walked together, one level per step; leaves point back to
+    themselves so a row that reaches a leaf early stays there.
+    """
+
+    def __init__(self, model: RandomForestClassifier, transform: CompiledTransform):
+        n_num = len(transform.numeric_cols)
+        sources = np.array([transform.feature_source(f) for f in range(transform.n_features)],
+                           dtype=np.int64).reshape(-1, 3)
+        column, lo, hi, children, proba, roots = [], [], [], [], [], []
+        offset, self.depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left < 0
+            is_num, source, level = sources[np.where(leaf, 0, tree.feature)].T
+            is_num = is_num.astype(bool)
+            column.append(np.where(is_num, source, source + n_num))
+            # Leaves get an empty interval and so always "go left" to themselves.
+            lo.append(np.where(leaf, np.inf, np.where(is_num, tree.threshold, level - 0.5)))
+            hi.append(np.where(is_num, np.inf, level + 0.5))
+            children.append(np.column_stack([np.where(leaf, nodes, tree.children_left),
+                                             np.where(leaf, nodes, tree.children_right)]).ravel() + offset)
+            value = tree.value[:, 0, :]
+            proba.append(value / value.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            offset += tree.node_count
+            self.depth = max(self.depth, tree.max_depth)
+        self.column, self.lo, self.hi = np.concatenate(column), np.concatenate(lo), np.concatenate(hi)
+        self.children, self.proba = np.concatenate(children), np.concatenate(proba)
+        self.roots = np.array(roots)
+        self.forest, self.transform = model, transform
+
+    def predict_proba(self, numeric: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        if len(numeric) > TREE_NUMPY_MAX_ROWS:
+            return self.forest.predict_proba(self.transform.to_sparse(numeric, codes))
+        # Trees split on float32 features; round exactly as their input validation does.
+        scaled = self.transform.scaled(numeric).astype(np.float32)
+        values = np.hstack([scaled.astype(np.float64), codes])
+        out = np.empty((len(values), self.proba.shape[1]))
+        for start in range(0, len(values), TREE_BLOCK_ROWS):
+            block = values[start:start + TREE_BLOCK_ROWS]
+            rows = np.arange(len(block))[:, None]
+            nodes = np.broadcast_to(self.roots, (len(block), len(self.roots)))
+            for _ in range(self.depth):
+                value = block[rows, self.column[nodes]]
+                right = (value > self.lo[nodes]) & (value <= self.hi[nodes])
+                nodes = self.children[2 * nodes + right]
+            out[start:start + len(block)] = self.proba[nodes].mean(axis=1)
+        return out
+
+
+COMPILERS = {
+    LogisticRegression: CompiledLinear,
+    RandomForestClassifier: CompiledForest
+}
+
+
+class CompiledPredictor:
+    """Preprocessing plus model as NumPy arithmetic on raw customer frames."""
+
+    def __init__(self, preprocessor: ColumnTransformer, model):
+        compiler = COMPILERS.get(type(model))
+        if compiler is None:
+            raise TypeError(f"No compiled path for {type(model).__name__}.")
+        self.transform = CompiledTransform(preprocessor)
+        self.model = compiler(model, self.transform)
+        self.classes_ = model.classes_
+
+    def predict_proba(self, frame: pd.DataFrame) -> np.ndarray:
+        return self.model.predict_proba(*self.transform.transform(frame))
+
+    def predict(self, frame: pd.DataFrame) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(frame), axis=1)]
+
+
+def probe_frame(preprocessor: ColumnTransformer, n_rows: int = PROBE_ROWS, seed: int = 42) -> pd.DataFrame:
+    """Synthetic rows covering the fitted categories, numeric values around each
+    column's mean, missing values and an unseen category."""
+    transform = CompiledTransform(preprocessor)
+    rng = np.random.RandomState(seed)
+    frame = pd.DataFrame(index=range(n_rows))
+    for i, col in enumerate(transform.numeric_cols):
+        values = transform.mean[i] + transform.scale[i] * rng.normal(size=n_rows) * 2
+        values[rng.rand(n_rows) < 0.02] = np.nan
+        frame[col] = values
+    for i, col in enumerate(transform.categorical_cols):
+        levels = list(transform.categories[i][transform.categories[i] != transform.fill_value])
+        values = np.array((levels or ['?']) * (n_rows // max(len(levels), 1) + 1), dtype=object)[:n_rows]
+        values = rng.permutation(values)
+        values[rng.rand(n_rows) < 0.02] = None
+        values[rng.rand(n_rows) < 0.02] = '__unseen__'
+        frame[col] = values
+    return frame[transform.columns]
+
+
+def check_parity(predictor: CompiledPredictor, preprocessor: ColumnTransformer, model, frame: pd.DataFrame,
+                 atol: float = PARITY_ATOL):
+    """Raise ``ValueError`` if the compiled and sklearn probabilities differ on ``frame``."""
+    expected = model.predict_proba(preprocessor.transform(frame))
+    actual = predictor.predict_proba(frame)
+    error = np.abs(expected - actual).max() if len(frame) else 0.0
+    if not error <= atol:
+        raise ValueError(f"Compiled predictor differs from sklearn by {error:.3g} (tolerance {atol:g}).")
+
+
+def export_predictor(preprocessor: ColumnTransformer, model, check_frame: Optional[pd.DataFrame] = None,
+                     atol: float = PARITY_ATOL) -> CompiledPredictor:
+    """Compile a fitted preprocessor and model, verifying parity with sklearn on a
+    probe frame (and on ``check_frame`` if given) before returning it.
+
+    Raises ``TypeError`` for models or pipelines without a compiled path.
+    """
+    predictor = CompiledPredictor(preprocessor, model)
+    check_parity(predictor, preprocessor, model, probe_frame(preprocessor), atol)
+    if check_frame is not None:
+        check_parity(predictor, preprocessor, model, check_frame, atol)
+    return predictor
+
+
+def get_predictor(preprocessor: ColumnTransformer, model,
+                  check_frame: Optional[pd.DataFrame] = None) -> Optional[CompiledPredictor]:
+    """Cached ``export_predictor``; ``None`` when the model has no compiled path or fails parity."""
+    key = (id(preprocessor), id(model))
+    cached = _PREDICTORS.get(key)
+    # ids can be reused once an object is freed, so confirm the identities too.
+    if cached is not None and cached[0] is preprocessor and cached[1] is model:
+        return cached[2]
+    try:
+        predictor = export_predictor(preprocessor, model, check_frame)
+    except (TypeError, ValueError):
+        predictor = None
+    _PREDICTORS.put(key, (preprocessor, model, predictor))
+    return predictor
@@ -0,0 +1,194 @@
+# Out-of-core training
+"""Train ``partial_fit`` models on data streamed from disk in chunks.
+
+Nothing here holds the full dataset. One pass draws a uniform sample of
+``sample_rows`` rows (and collects the class labels); the preprocessor is
+fitted on that sample. Later passes transform and learn from one chunk at a
+time. Rows the sample never saw (new customers, rare categories) are handled
+by the encoder's ``handle_unknown='ignore'``. ``customerID`` is dropped first:
+an identifier one-hot encoded from a sample only adds width.
+
+Scores are progressive validation: each batch is scored by the model before
+it learns from it, so every row but the first batch's counts as held out
+exactly once (first epoch only; later epochs revisit rows the model has seen).
+A batch is a chunk, or a slice of one when the file has fewer than
+``MIN_BATCHES`` chunks, so a file that fits in one chunk is still scored.
+
+Memory bounds (``memory_bound_mb`` on each result). Peak memory depends on
+``chunksize``, the sample size and the encoded width, never on the number of
+rows:
+
+- the sample: ``sample_rows`` raw rows plus its encoded CSR matrix;
+- one raw chunk plus its encoded CSR matrix;
+- Naive Bayes: a dense copy of the chunk, ``chunksize * n_features * 8`` bytes;
+- Kernel SVM: the random feature map, ``chunksize * RBF_COMPONENTS * 8`` bytes;
+- model state: ``O(n_features)`` (``O(RBF_COMPONENTS * n_features)`` for the map).
+"""
+import io
+import math
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy.sparse import issparse
+from sklearn.base import clone
+from sklearn.kernel_approximation import RBFSampler
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, LabelEncoder
+from utils.data_loader import stream_data, clean_data, _concat_chunks
+from utils.instrumentation import profiled
+from utils.preprocessing import build_preprocessor
+
+
+INCREMENTAL_CHUNK_SIZE = 20_000
+SAMPLE_ROWS = 50_000
+RBF_COMPONENTS = 300
+# Chunks are sliced into at least this many learning batches over the file.
+MIN_BATCHES = 10
+
+
+def _to_dense(X):
+    return X.toarray() if issparse(X) else X
+
+
+# Pipelines have their leading steps fitted on the sample; only the final step
+# learns incrementally. GaussianNB only takes dense input, one chunk at a time.
+INCREMENTAL_SPECS = {
+    'SGD Logistic (incremental)': SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42),
+    'Naive Bayes (incremental)': Pipeline([
+        ('dense', FunctionTransformer(_to_dense, accept_sparse=True)),
+        ('nb', GaussianNB())
+    ]),
+    'Kernel SVM (incremental)': Pipeline([
+        ('rbf', RBFSampler(gamma='scale', n_components=RBF_COMPONENTS, random_state=42)),
+        ('sgd', SGDClassifier(loss='hinge', alpha=1e-4, random_state=42))
+    ])
+}
+
+
+def _chunks(source, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Stream ``source`` (a path, or CSV bytes from an upload) from the start."""
+    return stream_data(io.BytesIO(source) if isinstance(source, bytes) else source, chunksize)
+
+
+def sample_rows(source, n_rows: int = SAMPLE_ROWS, chunksize: int = INCREMENTAL_CHUNK_SIZE,
+                seed: int = 42) -> Tuple[pd.DataFrame, np.ndarray, int]:
+    """Uniform sample of ``n_rows`` rows in one pass, plus every class label and the row count.
+
+    Each row draws a random key and the sample is the ``n_rows`` smallest keys,
+    so only the sample and one chunk are held at a time.
+    """
+    rng = np.random.RandomState(seed)
+    pieces, keys, classes, total = [], [], set(), 0
+    for chunk in _chunks(source, chunksize):
+        total += len(chunk)
+        classes.update(chunk['Churn'].dropna().unique())
+        pieces.append(chunk)
+        keys.append(rng.random_sample(len(chunk)))
+        all_keys = np.concatenate(keys)
+        if len(all_keys) > n_rows:
+            threshold = np.partition(all_keys, n_rows - 1)[n_rows - 1]
+            pieces = [p[k <= threshold] for p, k in zip(pieces, keys)]
+            keys = [k[k <= threshold] for k in keys]
+    sample = _concat_chunks([p for p in pieces if len(p)] or pieces[:1]).reset_index(drop=True)
+    return sample, np.array(sorted(classes)), total
+
+
+def memory_bound_mb(estimator, chunksize: int, n_features: int, nnz_per_row: float) -> float:
+    """Upper estimate of the per-chunk working set of one model, in MB (see the module docstring)."""
+    steps = estimator.named_steps if isinstance(estimator, Pipeline) else {}
+    sparse_chunk = chunksize * nnz_per_row * 12
+    work = chunksize * n_features * 8 if 'dense' in steps else 0
+    if 'rbf' in steps:
+        work += chunksize * RBF_COMPONENTS * 8 + RBF_COMPONENTS * n_features * 8
+    return (sparse_chunk + work + n_features * 8 * 4) / 2 ** 20
+
+
+def _learner(model):
+    return model[-1] if isinstance(model, Pipeline) else model
+
+
+def _features(model, X):
+    return model[:-1].transform(X) if isinstance(model, Pipeline) else X
+
+
+@profiled
+def train_incremental(source, chunksize: int = INCREMENTAL_CHUNK_SIZE, sample_size: int = SAMPLE_ROWS,
+                      epochs: int = 1, progress: Optional[Callable[[Dict[str, Any]], None]] = None
+                      ) -> Dict[str, Dict[str, Any]]:
+    """Train every model in ``INCREMENTAL_SPECS`` chunk by chunk over ``source``.
+
+    ``source`` is a CSV path or the CSV's bytes. Results have the keys of
+    ``run_sweep`` results plus their own ``preprocessor`` (fitted on the
+    sample), ``label_encoder`` (fitted on the labels seen in ``source``) and
+    ``memory_bound_mb``. ``progress`` is called after each chunk
+    with ``epoch``, ``chunk`` and ``rows`` (rows learnt so far).
+    """
+    sample, classes, n_rows = sample_rows(source, sample_size, chunksize)
+    sample = clean_data(sample)
+    preprocessor = build_preprocessor(sample.drop('Churn', axis=1))
+    X_sample = preprocessor.fit_transform(sample.drop('Churn', axis=1))
+    le = LabelEncoder().fit(classes)
+    labels = le.transform(classes)
+    nnz_per_row = X_sample.nnz / max(X_sample.shape[0], 1) if issparse(X_sample) else X_sample.shape[1]
+
+    models, state = {}, {}
+    for name, estimator in INCREMENTAL_SPECS.items():
+        model = clone(estimator)
+        if isinstance(model, Pipeline):
+            model[:-1].fit(X_sample)
+        models[name] = model
+        state[name] = {'fitted': False, 'correct': 0, 'scored': 0, 'chunk_scores': [], 'fit_time': 0.0}
+    del sample, X_sample
+
+    batch_rows = max(1, min(chunksize, math.ceil(n_rows / MIN_BATCHES)))
+    start = time.time()
+    seen = 0
+    for epoch in range(epochs):
+        for i, chunk in enumerate(_chunks(source, chunksize)):
+            chunk = clean_data(chunk).dropna(subset=['Churn'])
+            X_chunk = preprocessor.transform(chunk.drop('Churn', axis=1))
+            y_chunk = le.transform(chunk['Churn'])
+            for b in range(0, len(y_chunk), batch_rows):
+                X, y = X_chunk[b:b + batch_rows], y_chunk[b:b + batch_rows]
+                for name, model in models.items():
+                    s = state[name]
+                    fit_start = time.perf_counter()
+                    Xm = _features(model, X)
+                    if s['fitted'] and epoch == 0:
+                        correct = int((_learner(model).predict(Xm) == y).sum())
+                        s['correct'] += correct
+                        s['scored'] += len(y)
+                        s['chunk_scores'].append(correct / len(y))
+                    _learner(model).partial_fit(Xm, y, classes=labels)
+                    s['fitted'] = True
+                    s['fit_time'] += time.perf_counter() - fit_start
+            seen += len(chunk)
+            if progress is not None:
+                progress({'epoch': epoch, 'chunk': i, 'rows': seen})
+    wall_time = time.time() - start
+
+    results = {}
+    for name, model in models.items():
+        s = state[name]
+        chunk_scores = np.array(s['chunk_scores'])
+        score = s['correct'] / s['scored'] if s['scored'] else np.nan
+        results[name] = {
+            'model': model,
+            'name': name,
+            'best_params': {'chunksize': chunksize, 'epochs': epochs, 'sample_rows': min(sample_size, n_rows)},
+            'best_score': score,
+            'cv_mean': score,
+            'cv_std': chunk_scores.std() if len(chunk_scores) else np.nan,
+            'cv_scores': chunk_scores,
+            'fit_time': s['fit_time'],
+            'wall_time': wall_time,
+            'search': {'strategy': 'incremental', 'rows': n_rows, 'scored_rows': s['scored']},
+            'preprocessor': preprocessor,
+            'label_encoder': le,
+            'memory_bound_mb': memory_bound_mb(model, chunksize, len(preprocessor.get_feature_names_out()),
+                                               nnz_per_row)
+        }
+    return results
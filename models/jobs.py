@@ -0,0 +1,185 @@
+# Background training jobs
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import pandas as pd
+from models.trainer import MODEL_DIR
+
+
+JOB_DB_PATH = MODEL_DIR / 'jobs.sqlite'
+# Concurrent sweeps per replica; each gets an equal share of the cores so one
+# analyst's sweep cannot starve the others (or the Streamlit script threads).
+JOB_WORKERS = int(os.environ.get('TELCO_JOB_WORKERS', 2))
+ACTIVE_STATUSES = ('queued', 'running')
+# Identifies this server process. PIDs repeat across container restarts (streamlit runs as PID 1).
+SERVER_ID = uuid.uuid4().hex
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _connect() -> sqlite3.Connection:
+    JOB_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, owner TEXT, status TEXT, created REAL, started REAL, finished REAL,
+            cancel_requested INTEGER DEFAULT 0, done INTEGER DEFAULT 0, total INTEGER DEFAULT 0,
+            options TEXT, registry_id TEXT, error TEXT, host TEXT, server_pid INTEGER, server_id TEXT
+        );
+        CREATE TABLE IF NOT EXISTS job_events (
+            job_id TEXT, ts REAL, model TEXT, candidate INTEGER, fold INTEGER, score REAL
+        );
+        CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id);
+    """)
+    if 'server_id' not in {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}:
+        conn.execute("ALTER TABLE jobs ADD COLUMN server_id TEXT")
+    return conn
+
+
+@contextmanager
+def _db():
+    """Short-lived connection that commits on success and always closes."""
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _update(job_id: str, **fields):
+    with _db() as conn:
+        conn.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?", [*fields.values(), job_id])
+
+
+def _lower_priority():
+    """Worker initializer: run jobs below the interactive server, once per worker (workers are reused)."""
+    if hasattr(os, 'nice'):
+        os.nice(5)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Jobs this host left queued or running belonged to a server process that has exited.
+            with _db() as conn:
+                conn.execute("UPDATE jobs SET status = 'failed', error = 'Server restarted', finished = ? "
+                             "WHERE status IN (?, ?) AND host = ? AND IFNULL(server_id, '') != ?",
+                             (time.time(), *ACTIVE_STATUSES, socket.gethostname(), SERVER_ID))
+            # spawn, not fork: the Streamlit server process is multi-threaded.
+            _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_lower_priority)
+        return _executor
+
+
+def _run_job(job_id: str, X, y, preprocessor, le, df: pd.DataFrame, cv: int, search: str,
+             search_options: Dict[str, Any], incremental: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Worker-process entry point: run the sweep, stream progress to the job table, register the result.
+
+    ``incremental`` holds ``train_incremental`` arguments; those models are
+    trained after the sweep and registered with it.
+    """
+    from models.trainer import train_all_models
+    from models.incremental import train_incremental
+    from models.registry import register
+
+    conn = _connect()
+    if conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]:
+        _update(job_id, status='cancelled', finished=time.time())
+        return None
+    _update(job_id, status='running', started=time.time())
+
+    def progress(event: Dict[str, Any]):
+        with conn:
+            conn.execute("INSERT INTO job_events VALUES (?, ?, ?, ?, ?, ?)",
+                         (job_id, time.time(), event['model'], event['candidate'], event['fold'], float(event['score'])))
+            conn.execute("UPDATE jobs SET done = ?, total = ? WHERE id = ?", (event['done'], event['total'], job_id))
+        if conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]:
+            raise JobCancelled(job_id)
+
+    n_jobs = max(1, (os.cpu_count() or 1) // JOB_WORKERS)
+    try:
+        results = train_all_models(X, y, cv=cv, search=search, frame=df, n_jobs=n_jobs, progress=progress,
+                                   **search_options)
+        if incremental:
+            def check_cancel(event: Dict[str, Any]):
+                if conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]:
+                    raise JobCancelled(job_id)
+            results.update(train_incremental(progress=check_cancel, **incremental))
+        registry_id = register(results, preprocessor, le, df)
+        _update(job_id, status='done', finished=time.time(), registry_id=registry_id)
+        return registry_id
+    except JobCancelled:
+        _update(job_id, status='cancelled', finished=time.time())
+    except Exception as e:
+        _update(job_id, status='failed', finished=time.time(), error=str(e))
+    finally:
+        conn.close()
+    return None
+
+
+def submit_training(X, y, preprocessor, le, df: pd.DataFrame, cv: int = 5, search: str = 'grid',
+                    owner: Optional[str] = None, incremental: Optional[Dict[str, Any]] = None,
+                    **search_options) -> str:
+    """Queue a full training sweep on the background pool and return its job id."""
+    job_id = uuid.uuid4().hex[:12]
+    with _db() as conn:
+        conn.execute("INSERT INTO jobs (id, owner, status, created, options, host, server_pid, server_id) "
+                     "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                     (job_id, owner, time.time(),
+                      repr({'cv': cv, 'search': search, 'incremental': bool(incremental), **search_options}),
+                      socket.gethostname(), os.getpid(), SERVER_ID))
+    future = _get_executor().submit(_run_job, job_id, X, y, preprocessor, le, df, cv, search, search_options,
+                                    incremental)
+
+    def on_done(f):
+        # Only reached when the worker itself died or the inputs could not be pickled.
+        if not f.cancelled() and f.exception() is not None:
+            _update(job_id, status='failed', finished=time.time(), error=str(f.exception()))
+
+    future.add_done_callback(on_done)
+    return job_id
+
+
+def cancel(job_id: str):
+    """Ask a job to stop; queued jobs stop before starting, running jobs after their current fit."""
+    _update(job_id, cancel_requested=1)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with _db() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_jobs(limit: int = 20) -> List[Dict[str, Any]]:
+    with _db() as conn:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def job_progress(job_id: str) -> pd.DataFrame:
+    """Per-model fits completed and best mean fold score so far."""
+    with _db() as conn:
+        events = pd.read_sql_query("SELECT model, candidate, fold, score FROM job_events WHERE job_id = ?",
+                                   conn, params=(job_id,))
+    if events.empty:
+        return pd.DataFrame(columns=['Model', 'Fits Done', 'Best Mean Score'])
+    best = events.groupby(['model', 'candidate'])['score'].mean().groupby('model').max()
+    return pd.DataFrame({'Fits Done': events.groupby('model').size(), 'Best Mean Score': best}) \
+        .rename_axis('Model').reset_index()
@@ -0,0 +1,195 @@
+# Model registry
+from collections.abc import Mapping
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import json
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+from models.trainer import MODEL_DIR, save_model, load_model
+from utils.cache import frame_key
+
+
+REGISTRY_DIR = MODEL_DIR / 'registry'
+MANIFEST_PATH = REGISTRY_DIR / 'manifest.json'
+# Result keys kept in the manifest so the leaderboard renders without unpickling a model.
+METRIC_KEYS = ['name', 'best_params', 'best_score', 'cv_mean', 'cv_std', 'fit_time', 'wall_time', 'search',
+               'memory_bound_mb', 'recall', 'calibration']
+
+
+def _json_safe(value):
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _feature_columns(df: pd.DataFrame) -> List[str]:
+    return [str(c) for c in df.columns if c != 'Churn']
+
+
+def _column_kinds(df: pd.DataFrame) -> List[str]:
+    """``bool``/``num``/``str`` per feature column: a preprocessor fitted on one kind ignores another."""
+    return ['bool' if is_bool_dtype(df[c]) else 'num' if is_numeric_dtype(df[c]) else 'str'
+            for c in df.columns if c != 'Churn']
+
+
+def read_manifest() -> List[Dict[str, Any]]:
+    """All registered artifacts, oldest first."""
+    if not MANIFEST_PATH.exists():
+        return []
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+@contextmanager
+def _manifest_lock(timeout: float = 30.0):
+    """Cross-process lock around manifest updates (sessions and background jobs both register)."""
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    lock_path = REGISTRY_DIR / 'manifest.lock'
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > timeout:
+                    os.unlink(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError("Timed out waiting for the model registry lock.")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.unlink(lock_path)
+
+
+def _write_manifest(entries: List[Dict[str, Any]]):
+    tmp = MANIFEST_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def register(results: Dict[str, Dict[str, Any]], preprocessor, le, df: pd.DataFrame) -> str:
+    """Persist a training run (every result dict plus its preprocessing) and index it in the manifest."""
+    fingerprint = frame_key(df)
+    artifact_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{fingerprint[:8]}"
+    folder = f"registry/{artifact_id}"
+    save_model({'preprocessor': preprocessor, 'label_encoder': le}, f"{folder}/preprocessing.joblib")
+    models = {}
+    for name, result in results.items():
+        filename = f"{folder}/{re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_').lower()}.joblib"
+        save_model(dict(result), filename)
+        models[name] = {'file': filename, **_json_safe({k: result.get(k) for k in METRIC_KEYS})}
+    entry = {
+        'id': artifact_id,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'fingerprint': fingerprint,
+        'n_rows': len(df),
+        'columns': _feature_columns(df),
+        'kinds': _column_kinds(df),
+        'preprocessing': f"{folder}/preprocessing.joblib",
+        'models': models
+    }
+    with _manifest_lock():
+        _write_manifest(read_manifest() + [entry])
+    return artifact_id
+
+
+def latest_compatible(df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """Newest artifact trained on exactly ``df``, else the newest with the same feature columns and kinds."""
+    entries = read_manifest()
+    if not entries:
+        return None
+    fingerprint = frame_key(df)
+    for entry in reversed(entries):
+        if entry['fingerprint'] == fingerprint:
+            return entry
+    columns, kinds = _feature_columns(df), _column_kinds(df)
+    for entry in reversed(entries):
+        if entry['columns'] == columns and entry.get('kinds', kinds) == kinds:
+            return entry
+    return None
+
+
+class LazyResult(Mapping):
+    """Result dict whose fitted model is only read from disk, memory-mapped, on first access.
+
+    ``METRIC_KEYS`` are answered from the manifest alone; one missing there
+    (older manifests) raises ``KeyError`` rather than loading the model.
+    ``on_load`` is called once the model is in memory.
+    """
+
+    def __init__(self, meta: Dict[str, Any], on_load: Optional[Callable[[], None]] = None):
+        self._meta = meta
+        self._on_load = on_load
+        self._result = None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._result is None:
+            self._result = load_model(self._meta['file'], mmap_mode='r')
+            if self._on_load is not None:
+                self._on_load()
+        return self._result
+
+    def __getitem__(self, key):
+        if key != 'model' and key in self._meta:
+            return self._meta[key]
+        if key in METRIC_KEYS:
+            raise KeyError(key)
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+def read_artifact(artifact_id: str, on_load: Optional[Callable[[], None]] = None
+                  ) -> Tuple[Dict[str, LazyResult], Any, Any]:
+    """Read ``(results, preprocessor, label_encoder)`` of an artifact from disk, outside the shared store."""
+    entry = next(e for e in read_manifest() if e['id'] == artifact_id)
+    preprocessing = load_model(entry['preprocessing'])
+    results = {name: LazyResult(meta, on_load) for name, meta in entry['models'].items()}
+    return results, preprocessing['preprocessor'], preprocessing['label_encoder']
+
+
+def load_artifact(artifact_id: str) -> Tuple[Dict[str, LazyResult], Any, Any]:
+    """Return ``(results, preprocessor, label_encoder)`` for an artifact, shared by every session that loads it."""
+    # Imported here so the scoring service can read artifacts without Streamlit.
+    from utils.store import get_store, shared
+
+    key = f"models:{artifact_id}"
+    # The entry is sized before any model loads; re-measure it as each one does.
+    return shared(key, 'models', lambda: read_artifact(artifact_id, lambda: get_store().refresh(key)))
+
+
+def warm_start(session_state, df: pd.DataFrame) -> Optional[str]:
+    """Attach the latest compatible artifact to a session that has no trained models yet."""
+    if session_state.get('model_results'):
+        return session_state.get('registry_id')
+    entry = latest_compatible(df)
+    if entry is None:
+        return None
+    results, preprocessor, le = load_artifact(entry['id'])
+    session_state['model_results'] = results
+    session_state['preprocessor'] = preprocessor
+    session_state['label_encoder'] = le
+    session_state['registry_id'] = entry['id']
+    return entry['id']
@@ -0,0 +1,250 @@
+# Sweep engine
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import math
+import time
+import warnings
+from contextlib import nullcontext
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold, ParameterGrid
+from sklearn.utils import _safe_indexing
+from utils.cache import LRUCache, bytes_fingerprint, frame_fingerprint
+from utils.sparsity import densify_guard
+
+
+_FOLD_CACHE = LRUCache(maxsize=4)
+
+
+def make_folds(X, y, cv: int = 5) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Build the CV splits once so every model and candidate shares them."""
+    return list(StratifiedKFold(n_splits=cv).split(X, y))
+
+
+def grid_schedule(n_candidates: int, max_resource: int, min_resource: int, factor: int) -> List[int]:
+    """Fit every candidate once on the full resource."""
+    return [max_resource]
+
+
+def halving_schedule(n_candidates: int, max_resource: int, min_resource: int, factor: int) -> List[int]:
+    """Grow the resource by ``factor`` per round until one candidate is left on the full resource."""
+    n_rounds = math.ceil(math.log(max(n_candidates, 1), factor)) + 1
+    n_rounds = min(n_rounds, int(math.log(max(max_resource / min_resource, 1), factor)) + 1)
+    return [max(max_resource // factor ** (n_rounds - 1 - i), min_resource) for i in range(n_rounds)]
+
+
+SEARCH_STRATEGIES = {
+    'grid': grid_schedule,
+    'halving': halving_schedule
+}
+
+
+def fold_matrices(frame, folds: List[Tuple[np.ndarray, np.ndarray]],
+                  build_preprocessor: Callable) -> List[Tuple[Any, Any]]:
+    """``(X_train, X_test)`` per fold from a preprocessor fitted on that fold's training rows only.
+
+    Rows follow each fold's index order. Memoized on the frame's content, the
+    folds and the builder, so every candidate of every model (and later sweeps
+    over the same data) reuses one transform per fold. Holds about ``cv``
+    copies of the full feature matrix.
+    """
+    key = (frame_fingerprint(frame), bytes_fingerprint(b''.join(i.tobytes() for fold in folds for i in fold)),
+           f"{build_preprocessor.__module__}.{build_preprocessor.__qualname__}")
+    matrices = _FOLD_CACHE.get(key)
+    if matrices is None:
+        matrices = []
+        for train, test in folds:
+            preprocessor = build_preprocessor(frame.iloc[train])
+            matrices.append((preprocessor.fit_transform(frame.iloc[train]), preprocessor.transform(frame.iloc[test])))
+        _FOLD_CACHE.put(key, matrices)
+    return matrices
+
+
+def _guard(densify: Optional[str]):
+    return nullcontext() if densify is None else densify_guard(densify)
+
+
+def _fit_and_score(estimator, params: Dict[str, Any], train, test, X, y,
+                   X_test=None, y_test=None, densify: Optional[str] = None) -> Tuple[float, float, float]:
+    """Fit one (params, fold) task and return (accuracy, start, end).
+
+    With ``X_test``/``y_test`` (fold-wise matrices) the test rows are given
+    directly and ``train`` indexes ``X``, the fold's own training matrix.
+    A failing fit scores NaN, like ``GridSearchCV(error_score=np.nan)``.
+    """
+    start = time.time()
+    model = clone(estimator).set_params(**params)
+    try:
+        with _guard(densify):
+            model.fit(_safe_indexing(X, train), y[train])
+            if X_test is None:
+                X_test, y_test = _safe_indexing(X, test), y[test]
+            score = model.score(X_test, y_test)
+    except Exception as e:
+        warnings.warn(f"Fit failed for {params}: {e}")
+        score = np.nan
+    return score, start, time.time()
+
+
+def _refit(estimator, params: Dict[str, Any], X, y, densify: Optional[str] = None):
+    """Refit the winning candidate on the full data."""
+    start = time.time()
+    with _guard(densify):
+        model = clone(estimator).set_params(**params).fit(X, y)
+    return model, start, time.time()
+
+
+def _plan(estimator, grid: Dict[str, list], n_samples: int, n_min_samples: int,
+          strategy: str, resource: str, factor: int) -> Dict[str, Any]:
+    """Resolve the candidates and the per-round resource schedule for one model."""
+    grid = dict(grid)
+    if resource == 'n_estimators' and 'n_estimators' in estimator.get_params():
+        max_r = max(grid.pop('n_estimators', [estimator.get_params()['n_estimators']]))
+        min_r = min(10, max_r)
+    else:
+        resource, max_r, min_r = 'n_samples', n_samples, min(n_min_samples, n_samples)
+    candidates = list(ParameterGrid(grid))
+    return {
+        'candidates': candidates,
+        'alive': list(range(len(candidates))),
+        'resource': resource,
+        'schedule': SEARCH_STRATEGIES[strategy](len(candidates), max_r, min_r, factor),
+        'round': 0,
+        'spent': 0.0,
+        'spans': [],
+        'rounds': [],
+        'budget_exhausted': False
+    }
+
+
+def _task_args(plan: Dict[str, Any], c: int, fold: Tuple[np.ndarray, np.ndarray]):
+    """Apply the current round's resource to one candidate and fold."""
+    r = plan['schedule'][plan['round']]
+    params, (train, test) = plan['candidates'][c], fold
+    if plan['resource'] == 'n_estimators':
+        params = {**params, 'n_estimators': r}
+    else:
+        train = train[:r]
+    return params, train, test
+
+
+def _task_data(name: str, plan: Dict[str, Any], c: int, f: int, folds, fold_data, features: Dict[str, Any], X, y):
+    """``_fit_and_score`` arguments after the estimator for one task."""
+    params, train, test = _task_args(plan, c, folds[f])
+    if fold_data is None or name in features:
+        return params, train, test, features.get(name, X), y
+    X_train, X_test = fold_data[f]
+    # The fold matrix is in folds[f]'s row order, so a sample prefix is a row-range prefix.
+    return params, np.arange(len(train)), None, X_train, y[folds[f][0]], X_test, y[test]
+
+
+def run_sweep(specs: Dict[str, Tuple[Any, Dict[str, list]]], X, y, cv: int = 5, n_jobs: int = -1,
+              strategy: str = 'grid', resource: str = 'n_samples', factor: int = 3,
+              budget: Optional[float] = None,
+              progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+              features: Optional[Dict[str, Any]] = None, frame=None,
+              build_preprocessor: Optional[Callable] = None,
+              densify: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Cross-validate every spec on shared folds as one task graph on a process pool.
+
+    ``specs`` maps a model name to ``(estimator, param_grid)``. ``strategy`` is a
+    key of ``SEARCH_STRATEGIES``; ``resource`` (``'n_samples'`` or
+    ``'n_estimators'``) and ``factor`` drive its halving rounds. ``budget`` caps
+    the fit seconds per model. ``progress`` gets a dict of ``model``,
+    ``candidate``, ``fold``, ``score``, ``done`` and ``total`` per fit; raising
+    from it aborts the sweep. ``features`` maps a model name to its own matrix
+    for the same rows. ``frame`` and ``build_preprocessor`` make the folds
+    fold-aware. ``densify`` (``'warn'`` or ``'raise'``) runs fits under
+    ``densify_guard``.
+    """
+    y = np.asarray(y)
+    features = features or {}
+    folds = make_folds(X, y, cv)
+    if strategy != 'grid':
+        # Sample-resource rounds take a prefix of a fixed shuffle of each training fold.
+        rng = np.random.RandomState(42)
+        folds = [(rng.permutation(train), test) for train, test in folds]
+    fold_data = None
+    if frame is not None and build_preprocessor is not None:
+        fold_data = fold_matrices(frame, folds, build_preprocessor)
+    n_min_samples = 2 * cv * len(np.unique(y))
+    plans = {name: _plan(est, grid, len(folds[0][0]), n_min_samples, strategy, resource, factor)
+             for name, (est, grid) in specs.items()}
+
+    active = list(specs)
+    done = total = 0
+    with Parallel(n_jobs=n_jobs, backend='loky', return_as='generator') as parallel:
+        while active:
+            tasks = [(name, c, f) for name in active for c in plans[name]['alive'] for f in range(len(folds))]
+            total += len(tasks)
+            outputs = parallel(
+                delayed(_fit_and_score)(specs[name][0],
+                                        *_task_data(name, plans[name], c, f, folds, fold_data, features, X, y),
+                                        densify=densify)
+                for name, c, f in tasks
+            )
+
+            scores = {name: {} for name in active}
+            # Drain the generator itself (not zip) so the pool is free for the next round.
+            for (score, start, end), (name, c, f) in zip(outputs, tasks):
+                scores[name].setdefault(c, np.zeros(len(folds)))[f] = score
+                plans[name]['spans'].append((start, end))
+                plans[name]['spent'] += end - start
+                done += 1
+                if progress is not None:
+                    progress({'model': name, 'candidate': c, 'fold': f, 'score': score, 'done': done, 'total': total})
+
+            for name in list(active):
+                plan = plans[name]
+                means = np.array([scores[name][c].mean() for c in plan['alive']])
+                if np.isnan(means).all():
+                    raise ValueError(f"All candidate fits failed for {name}.")
+                order = [plan['alive'][i] for i in np.argsort(np.where(np.isnan(means), np.inf, -means), kind='stable')]
+                plan['best'], plan['best_scores'] = order[0], scores[name][order[0]]
+                plan['rounds'].append({'resource': plan['schedule'][plan['round']], 'n_candidates': len(order)})
+                last_round = plan['round'] + 1 >= len(plan['schedule'])
+                plan['budget_exhausted'] = not last_round and budget is not None and plan['spent'] > budget
+                if last_round or plan['budget_exhausted']:
+                    active.remove(name)
+                else:
+                    plan['alive'] = order[:max(1, math.ceil(len(order) / factor))]
+                    plan['round'] += 1
+
+        refits = list(parallel(
+            delayed(_refit)(specs[name][0], _final_params(plans[name]), features.get(name, X), y, densify)
+            for name in specs
+        ))
+
+    results = {}
+    for name, (model, start, end) in zip(specs, refits):
+        plan = plans[name]
+        plan['spans'].append((start, end))
+        best_scores = plan['best_scores']
+        results[name] = {
+            'model': model,
+            'name': name,
+            'best_params': _final_params(plan),
+            'best_score': best_scores.mean(),
+            'cv_mean': best_scores.mean(),
+            'cv_std': best_scores.std(),
+            'cv_scores': best_scores,
+            'fit_time': sum(e - s for s, e in plan['spans']),
+            # First to last fit; other models' tasks interleave on the shared pool, so this is not its cost.
+            'wall_time': max(e for _, e in plan['spans']) - min(s for s, _ in plan['spans']),
+            'search': {
+                'strategy': strategy,
+                'resource': plan['resource'],
+                'rounds': plan['rounds'],
+                'budget_exhausted': plan['budget_exhausted'],
+                'fold_aware': fold_data is not None and name not in features
+            }
+        }
+    return results
+
+
+def _final_params(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Winning parameters, with an ``n_estimators`` resource pinned to its last round."""
+    params = dict(plan['candidates'][plan['best']])
+    if plan['resource'] == 'n_estimators':
+        params['n_estimators'] = plan['schedule'][plan['round']]
+    return params
@@ -1,118 +1,172 @@
-from typing import Dict, Any
-from sklearn.model_selection import cross_val_score, GridSearchCV, RandomizedSearchCV
+from contextlib import nullcontext
+from typing import Dict, Any, Optional, Tuple
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
 from sklearn.neighbors import KNeighborsClassifier
-from sklearn.metrics import accuracy_score, classification_report
-import numpy as np
-import pandas as pd
 import joblib
 from pathlib import Path
+from models.ann import ApproxKNNClassifier
+from models.boosting import hist_gb_spec
+from models.calibration import CalibratedClassifier, calibration_info
+from models.sweep import run_sweep
+from utils.instrumentation import profiled
+from utils.preprocessing import build_preprocessor, build_sparse_preprocessor, preprocess_ordinal
+from utils.sparsity import DENSIFY_ACTION, densify_guard
 
 
 MODEL_DIR = Path(__file__).parent.parent / 'models'
+# Trained on its own ordinal features (see ``preprocess_ordinal``), so it needs the raw frame.
+HIST_GB_NAME = 'Hist Gradient Boosting'
+
+
+MODEL_SPECS = {
+    'Random Forest': (RandomForestClassifier(random_state=42),
+                      {'n_estimators': [100, 200], 'max_depth': [None, 10, 20]}),
+    'Logistic Regression': (LogisticRegression(random_state=42, max_iter=1000),
+                            {'C': [0.1, 1, 10], 'solver': ['liblinear', 'lbfgs']}),
+    'Gradient Boosting': (GradientBoostingClassifier(random_state=42),
+                          {'n_estimators': [100, 200], 'learning_rate': [0.05, 0.1], 'max_depth': [3, 5]}),
+    # No ``probability=True``: its hidden 5-fold Platt refit ran inside every fit of the
+    # sweep. ``calibrate_results`` adds probabilities once, after the search.
+    'SVM': (SVC(random_state=42),
+            {'C': [0.1, 1], 'kernel': ['linear', 'rbf']}),
+    'KNN': (KNeighborsClassifier(),
+            {'n_neighbors': [3, 5, 7]}),
+    'KNN (ANN)': (ApproxKNNClassifier(random_state=42),
+                  {'n_neighbors': [3, 5, 7], 'n_probe': [2, 8]})
+}
+
+
+# Wider grids for successive halving, which drops poor candidates after cheap partial fits.
+HALVING_GRIDS = {
+    'Random Forest': {'n_estimators': [100, 200, 400], 'max_depth': [None, 10, 20, 30], 'min_samples_leaf': [1, 5]},
+    'Gradient Boosting': {'n_estimators': [100, 200, 400], 'learning_rate': [0.03, 0.05, 0.1, 0.2], 'max_depth': [3, 5]},
+    'SVM': {'C': [0.03, 0.1, 0.3, 1, 3], 'kernel': ['linear', 'rbf']}
+}
+
+
+def get_specs(search: str = 'grid') -> Dict[str, Tuple[Any, Dict[str, list]]]:
+    if search == 'grid':
+        return MODEL_SPECS
+    return {name: (est, HALVING_GRIDS.get(name, grid)) for name, (est, grid) in MODEL_SPECS.items()}
+
+
+def _with_recall(results: Dict[str, Dict[str, Any]], X) -> Dict[str, Dict[str, Any]]:
+    """Add ``recall`` (vs exact search) to the results of approximate-neighbour models."""
+    for result in results.values():
+        if isinstance(result['model'], ApproxKNNClassifier):
+            result['recall'] = result['model'].recall(X)
+    return results
 
 
-def train_random_forest(X, y, cv: int = 5) -> Dict[str, Any]:
-    param_grid = {'n_estimators': [100, 200], 'max_depth': [None, 10, 20]}
-    grid = GridSearchCV(RandomForestClassifier(random_state=42), param_grid, cv=cv, n_jobs=-1)
-    grid.fit(X, y)
-    best = grid.best_estimator_
-    cv_scores = cross_val_score(best, X, y, cv=cv, scoring='accuracy')
-    return {
-        'model': best,
-        'name': 'Random Forest',
-        'best_params': grid.best_params_,
-        'best_score': grid.best_score_,
-        'cv_mean': cv_scores.mean(),
-        'cv_std': cv_scores.std()
-    }
-
-
-def train_logistic_regression(X, y, cv: int = 5) -> Dict[str, Any]:
-    param_grid = {'C': [0.1, 1, 10], 'solver': ['liblinear', 'lbfgs']}
-    grid = GridSearchCV(LogisticRegression(random_state=42, max_iter=1000), param_grid, cv=cv, n_jobs=-1)
-    grid.fit(X, y)
-    best = grid.best_estimator_
-    cv_scores = cross_val_score(best, X, y, cv=cv, scoring='accuracy')
-    return {
-        'model': best,
-        'name': 'Logistic Regression',
-        'best_params': grid.best_params_,
-        'best_score': grid.best_score_,
-        'cv_mean': cv_scores.mean(),
-        'cv_std': cv_scores.std()
-    }
-
-
-def train_gradient_boosting(X, y, cv: int = 5) -> Dict[str, Any]:
-    param_grid = {'n_estimators': [100, 200], 'learning_rate': [0.05, 0.1], 'max_depth': [3, 5]}
-    grid = GridSearchCV(GradientBoostingClassifier(random_state=42), param_grid, cv=cv, n_jobs=-1)
-    grid.fit(X, y)
-    best = grid.best_estimator_
-    cv_scores = cross_val_score(best, X, y, cv=cv, scoring='accuracy')
-    return {
-        'model': best,
-        'name': 'Gradient Boosting',
-        'best_params': grid.best_params_,
-        'best_score': grid.best_score_,
-        'cv_mean': cv_scores.mean(),
-        'cv_std': cv_scores.std()
-    }
-
-
-def train_svm(X, y, cv: int = 5) -> Dict[str, Any]:
-    param_grid = {'C': [0.1, 1], 'kernel': ['linear', 'rbf']}
-    grid = RandomizedSearchCV(SVC(random_state=42, probability=True), param_grid, cv=cv, n_jobs=-1, n_iter=4)
-    grid.fit(X, y)
-    best = grid.best_estimator_
-    cv_scores = cross_val_score(best, X, y, cv=cv, scoring='accuracy')
-    return {
-        'model': best,
-        'name': 'SVM',
-        'best_params': grid.best_params_,
-        'best_score': grid.best_score_,
-        'cv_mean': cv_scores.mean(),
-        'cv_std': cv_scores.std()
-    }
-
-
-def train_knn(X, y, cv: int = 5) -> Dict[str, Any]:
-    param_grid = {'n_neighbors': [3, 5, 7]}
-    grid = GridSearchCV(KNeighborsClassifier(), param_grid, cv=cv, n_jobs=-1)
-    grid.fit(X, y)
-    best = grid.best_estimator_
-    cv_scores = cross_val_score(best, X, y, cv=cv, scoring='accuracy')
-    return {
-        'model': best,
-        'name': 'KNN',
-        'best_params': grid.best_params_,
-        'best_score': grid.best_score_,
-        'cv_mean': cv_scores.mean(),
-        'cv_std': cv_scores.std()
-    }
-
-
-def train_all_models(X, y, cv: int = 5) -> Dict[str, Dict[str, Any]]:
-    trainers = [
-        train_random_forest,
-        train_logistic_regression,
-        train_gradient_boosting,
-        train_svm,
-        train_knn
-    ]
-    results = {}
-    for trainer in trainers:
-        result = trainer(X, y, cv=cv)
-        results[result['name']] = result
+def calibrate_results(results: Dict[str, Dict[str, Any]], X, y, method: Optional[str] = None,
+                      features: Optional[Dict[str, Any]] = None,
+                      densify: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Calibration stage: wrap each result's model in a ``CalibratedClassifier``.
+
+    The calibrators are fitted on one held-out split shared by every model
+    (``calibration_split``), with one extra fit per model; the model that
+    predicts stays the sweep's refit on all rows. With ``method`` ``None`` only
+    models without ``predict_proba`` (the SVM) are calibrated, with
+    ``'sigmoid'``; ``'sigmoid'`` or ``'isotonic'`` calibrates every model.
+    ``features`` are the models' own matrices, as in ``run_sweep``.
+    """
+    features = features or {}
+    for name, result in results.items():
+        model = result['model']
+        if method is None and hasattr(model, 'predict_proba'):
+            continue
+        with densify_guard(densify) if densify is not None else nullcontext():
+            result['model'] = CalibratedClassifier.from_fitted(model, features.get(name, X), y, method or 'sigmoid')
+        result['calibration'] = calibration_info(result['model'])
     return results
 
 
+def _train(name: str, X, y, cv: int, search: str, calibration: Optional[str] = None,
+           **search_options) -> Dict[str, Any]:
+    specs = get_specs(search)
+    results = _with_recall(run_sweep({name: specs[name]}, X, y, cv=cv, strategy=search, **search_options), X)
+    return calibrate_results(results, X, y, calibration, densify=search_options.get('densify'))[name]
+
+
+@profiled
+def train_random_forest(X, y, cv: int = 5, search: str = 'grid', **search_options) -> Dict[str, Any]:
+    return _train('Random Forest', X, y, cv, search, **search_options)
+
+
+@profiled
+def train_logistic_regression(X, y, cv: int = 5, search: str = 'grid', **search_options) -> Dict[str, Any]:
+    return _train('Logistic Regression', X, y, cv, search, **search_options)
+
+
+@profiled
+def train_gradient_boosting(X, y, cv: int = 5, search: str = 'grid', **search_options) -> Dict[str, Any]:
+    return _train('Gradient Boosting', X, y, cv, search, **search_options)
+
+
+@profiled
+def train_svm(X, y, cv: int = 5, search: str = 'grid', **search_options) -> Dict[str, Any]:
+    return _train('SVM', X, y, cv, search, **search_options)
+
+
+@profiled
+def train_knn(X, y, cv: int = 5, search: str = 'grid', **search_options) -> Dict[str, Any]:
+    return _train('KNN', X, y, cv, search, **search_options)
+
+
+@profiled
+def train_knn_ann(X, y, cv: int = 5, search: str = 'grid', **search_options) -> Dict[str, Any]:
+    return _train('KNN (ANN)', X, y, cv, search, **search_options)
+
+
+@profiled
+def train_hist_gradient_boosting(frame, y, cv: int = 5, search: str = 'grid', calibration: Optional[str] = None,
+                                 **search_options) -> Dict[str, Any]:
+    """Histogram gradient boosting on ``frame``'s raw columns, with the categorical ones native.
+
+    The result's ``preprocessor`` maps raw customer rows to the model's features.
+    """
+    X_ord, preprocessor, mask = preprocess_ordinal(frame)
+    results = run_sweep({HIST_GB_NAME: hist_gb_spec(mask)}, X_ord, y, cv=cv, strategy=search, **search_options)
+    result = calibrate_results(results, X_ord, y, calibration)[HIST_GB_NAME]
+    result['preprocessor'] = preprocessor
+    return result
+
+
+@profiled
+def train_all_models(X, y, cv: int = 5, search: str = 'grid', frame=None, fold_aware: bool = False,
+                     sparse: bool = False, calibration: Optional[str] = None,
+                     **search_options) -> Dict[str, Dict[str, Any]]:
+    """Train every model in one ``run_sweep``.
+
+    ``search`` is a key of ``SEARCH_STRATEGIES``; ``search_options`` go to
+    ``run_sweep``. ``frame`` holds the raw rows behind ``X`` (needed by
+    histogram gradient boosting and ``fold_aware``). ``sparse`` marks ``X`` as
+    built by ``preprocess_data(sparse=True)``. ``calibration`` is a
+    ``calibrate_results`` method, or None.
+    """
+    if sparse:
+        search_options.setdefault('densify', DENSIFY_ACTION)
+    if fold_aware:
+        if frame is None:
+            raise ValueError("Fold-aware training needs the raw frame behind X.")
+        search_options.update(frame=frame.drop(columns=['Churn'], errors='ignore'),
+                              build_preprocessor=build_sparse_preprocessor if sparse else build_preprocessor)
+    specs, features, preprocessors = dict(get_specs(search)), {}, {}
+    if frame is not None:
+        X_ord, preprocessors[HIST_GB_NAME], mask = preprocess_ordinal(frame)
+        specs[HIST_GB_NAME], features[HIST_GB_NAME] = hist_gb_spec(mask), X_ord
+    results = run_sweep(specs, X, y, cv=cv, strategy=search, features=features, **search_options)
+    for name, preprocessor in preprocessors.items():
+        results[name]['preprocessor'] = preprocessor
+    return calibrate_results(_with_recall(results, X), X, y, calibration, features, search_options.get('densify'))
+
+
 def save_model(result: Dict[str, Any], filename: str):
-    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    (MODEL_DIR / filename).parent.mkdir(parents=True, exist_ok=True)
     joblib.dump(result, MODEL_DIR / filename)
 
 
-def load_model(filename: str) -> Dict[str, Any]:
-    return joblib.load(MODEL_DIR / filename)
+def load_model(filename: str, mmap_mode: Optional[str] = None) -> Dict[str, Any]:
+    return joblib.load(MODEL_DIR / filename, mmap_mode=mmap_mode)
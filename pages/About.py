@@ -22,7 +22,7 @@ def show():
     Each model includes:
     - Automated preprocessing pipelines
     - Cross-validation
-    - Hyperparameter tuning via GridSearchCV/RandomizedSearchCV
+    - Hyperparameter tuning via a parallel, shared-fold grid search
     - Performance metrics and visualizations
 
     **Developer:** Moses N Ndumbe  
@@ -1,60 +1,135 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils.data_loader import load_data
+from utils.data_loader import load_data, DEFAULT_DATA_PATH
+from utils.sketches import csv_sketch, frame_sketch, with_batch, append_batch
+from utils.profile import get_profile
 from utils.visualizations import (
     plot_histogram, plot_boxplot, plot_correlation_heatmap,
-    plot_pairplot, plot_churn_distribution, plot_missing_values
+    plot_pairplot, plot_churn_distribution, plot_missing_values, plot_churn_by_category, plot_churn_over_tenure
 )
 
 
+@st.cache_data
+def _csv_bytes(_df, fingerprint: str) -> bytes:
+    return _df.to_csv(index=False).encode('utf-8')
+
+
 def show():
     st.title("Exploratory Data Analysis")
     uploaded_file = st.sidebar.file_uploader("Upload CSV or Excel", type=['csv', 'xlsx', 'xls'], key="eda_upload")
-    df = load_data(uploaded_file=uploaded_file)
+    df = load_data(uploaded_file=uploaded_file, streaming=st.session_state.get('streaming_mode', False),
+                   compact=st.session_state.get('compact_mode', False))
     if df is None:
         return
 
+    profile = get_profile(df)
+    _key_metrics(_dataset_sketch(uploaded_file, df))
+
     st.sidebar.subheader("Filters")
-    numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-    cat_cols = df.select_dtypes(include=['object']).columns.tolist()
+    numeric_cols = profile.numeric_cols
+    cat_cols = profile.categorical_cols
 
     with st.expander("Dataset Overview"):
         st.dataframe(df.head(100))
-        st.write(f"**Shape:** {df.shape}")
-        st.write(f"**Columns:** {list(df.columns)}")
-        st.write(f"**Missing values:** {df.isnull().sum().sum()}")
-        st.write(df.describe(include='all'))
+        st.write(f"**Shape:** {profile.shape}")
+        st.write(f"**Columns:** {profile.columns}")
+        st.write(f"**Missing values:** {profile.missing.sum()}")
+        if 'memory_report' in df.attrs:
+            report = df.attrs['memory_report']
+            st.write(f"**Memory:** {report['before_mb']:.2f} MB → {report['after_mb']:.2f} MB "
+                     f"({report['ratio']:.1f}x smaller in compact mode)")
+        if 'ingest_stats' in df.attrs:
+            stats = df.attrs['ingest_stats']
+            st.write(f"**Typed streaming read:** {stats['rows']:,} rows in {stats['seconds']:.2f}s "
+                     f"({stats['rows_per_sec']:,.0f} rows/sec), {stats['frame_mb']:,.1f} MB frame, "
+                     f"{stats['peak_mb']:,.1f} MB peak")
+        st.write(profile.describe)
 
     st.markdown("---")
-    plot_missing_values(df)
+    plot_missing_values(profile)
 
     col1, col2 = st.columns(2)
     with col1:
-        plot_churn_distribution(df)
+        if 'Churn' in profile.value_counts:
+            plot_churn_distribution(profile)
     with col2:
         if numeric_cols:
-            plot_histogram(df, numeric_cols[0], f"Distribution of {numeric_cols[0]}")
+            plot_histogram(profile, numeric_cols[0], f"Distribution of {numeric_cols[0]}")
 
     if cat_cols:
         st.subheader("Categorical Analysis")
         cat = st.selectbox("Select categorical column", cat_cols)
-        fig = px.bar(df[cat].value_counts().reset_index(), x=cat, y='count', title=f"{cat} Distribution")
+        counts = profile.value_counts[cat]
+        fig = px.bar(x=counts.index.astype(str), y=counts.values, labels={'x': cat, 'y': 'count'}, title=f"{cat} Distribution")
         fig.update_layout(title_x=0.5)
         st.plotly_chart(fig, use_container_width=True)
 
     st.subheader("Correlation Heatmap")
     if numeric_cols:
-        plot_correlation_heatmap(df, numeric_cols)
+        plot_correlation_heatmap(profile, numeric_cols)
 
     st.subheader("Boxplots by Churn")
     num_for_box = st.selectbox("Select numeric column", numeric_cols)
-    plot_boxplot(df, 'Churn', num_for_box, f"{num_for_box} by Churn")
+    if profile.group_col:
+        plot_boxplot(profile, 'Churn', num_for_box, f"{num_for_box} by Churn")
 
     if st.checkbox("Show Pairplot (may be slow)"):
         selected = st.multiselect("Select columns", numeric_cols, default=numeric_cols[:3])
         if len(selected) >= 2:
             plot_pairplot(df, selected, 'Churn')
 
-    csv = df.to_csv(index=False).encode('utf-8')
+    csv = _csv_bytes(df, profile.fingerprint)
     st.download_button("Download Cleaned Data", csv, "cleaned_data.csv", "text/csv")
+
+
+def _dataset_sketch(uploaded_file, df: pd.DataFrame):
+    """Sketch of the dataset on screen, with any monthly batch from the sidebar previewed in.
+
+    The batch only changes this session's metrics until "Commit batch" folds it
+    into the sketch every session reads.
+    """
+    sketch = frame_sketch(df) if uploaded_file is not None else csv_sketch(DEFAULT_DATA_PATH)
+    batch_file = st.sidebar.file_uploader("Append monthly batch", type=['csv', 'xlsx', 'xls'], key="eda_batch",
+                                          help="Preview a new batch of customers in the key metrics without "
+                                               "re-reading the history.")
+    if batch_file is None:
+        return sketch
+    batch = load_data(uploaded_file=batch_file, streaming=st.session_state.get('streaming_mode', False),
+                      compact=st.session_state.get('compact_mode', False))
+    if batch is None:
+        return sketch
+    batch_id = batch.attrs['fingerprint']
+    if batch_id in sketch.batches:
+        st.sidebar.caption("This batch is already part of the dataset's metrics.")
+        return sketch
+    previews = st.session_state.setdefault('sketch_previews', {})
+    key = (sketch.dataset, sketch.n_rows, batch_id)
+    if key not in previews:
+        previews.clear()
+        previews[key] = with_batch(sketch, batch, batch_id)
+    if st.sidebar.button("Commit batch", help="Save the batch into the metrics every session sees. Do not also "
+                                              "append these rows to the CSV: they would be counted twice."):
+        previews.clear()
+        st.sidebar.success(f"Committed {len(batch):,} customers.")
+        return append_batch(sketch, batch, batch_id)
+    st.sidebar.caption(f"Previewing {len(batch):,} customers in this session only.")
+    return previews[key]
+
+
+def _key_metrics(sketch):
+    st.subheader("Key Metrics")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Customers", f"{sketch.n_rows:,}")
+    col2.metric("Churn Rate", f"{sketch.churn_rate:.1%}")
+    col3.metric("Avg Monthly Charges ($)", f"{sketch.mean('MonthlyCharges'):.2f}")
+    col4.metric("Avg Total Charges ($)", f"{sketch.mean('TotalCharges'):.2f}")
+    if sketch.batches:
+        st.caption(f"Includes {len(sketch.batches)} appended batch(es).")
+    col1, col2 = st.columns(2)
+    with col1:
+        if 'Contract' in sketch.levels:
+            plot_churn_by_category(sketch, 'Contract')
+    with col2:
+        if len(sketch.tenure):
+            plot_churn_over_tenure(sketch)
@@ -2,43 +2,101 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
-from utils.data_loader import load_data
-from utils.preprocessing import preprocess_data
+from scipy.sparse import issparse
+from utils.data_loader import load_data, DEFAULT_DATA_PATH
+from utils.preprocessing import preprocess_data_cached
+from utils.sparsity import matrix_nbytes, dense_nbytes
 from models.trainer import train_all_models
+from models.calibration import CALIBRATION_METHODS, base_model
+from models.incremental import train_incremental, INCREMENTAL_CHUNK_SIZE
+from models.registry import register, warm_start, load_artifact
+from models.jobs import submit_training, get_job, cancel, list_jobs, job_progress, ACTIVE_STATUSES
 from utils.visualizations import plot_confusion_matrix, plot_feature_importance
 
 
 def show():
     st.title("Model Training & Comparison")
     uploaded_file = st.sidebar.file_uploader("Upload dataset", type=['csv', 'xlsx'], key="train_upload")
-    df = load_data(uploaded_file=uploaded_file)
+    df = load_data(uploaded_file=uploaded_file, streaming=st.session_state.get('streaming_mode', False),
+                   compact=st.session_state.get('compact_mode', False))
     if df is None:
         return
 
     cv_folds = st.sidebar.slider("Cross-Validation Folds", 2, 10, 5)
     test_size = st.sidebar.slider("Test Set Size", 0.1, 0.4, 0.2)
+    search = st.sidebar.radio("Search Strategy", ["grid", "halving"],
+                              format_func=lambda s: {"grid": "Full Grid", "halving": "Successive Halving"}[s])
+    search_options = {}
+    if search == "halving":
+        search_options['resource'] = st.sidebar.selectbox("Halving Resource", ["n_samples", "n_estimators"])
+        search_options['factor'] = st.sidebar.slider("Halving Factor", 2, 5, 3)
+        budget = st.sidebar.number_input("Time Budget per Model (s, 0 = none)", min_value=0, value=0, step=10)
+        search_options['budget'] = budget or None
 
-    X, y, preprocessor, le = preprocess_data(df)
+    search_options['fold_aware'] = st.sidebar.checkbox(
+        "Fold-Aware Preprocessing", value=False,
+        help="Fit the scaler, imputers and encoder inside each CV fold so scores do not see the test rows. "
+             "Each fold is transformed once and shared by every candidate.")
+    search_options['sparse'] = st.sidebar.checkbox(
+        "Sparse-Native Mode", value=False,
+        help="Keep the feature matrix as float32 CSR (numeric columns scaled without centering) and warn "
+             "when a model converts it to a dense array.")
+    search_options['calibration'] = st.sidebar.selectbox(
+        "Probability Calibration", [None] + CALIBRATION_METHODS,
+        format_func=lambda m: "Only models without probabilities" if m is None else f"All models ({m})",
+        help="Calibrate on one held-out split after the search. SVMs are always calibrated this way "
+             "instead of refitting five times for probabilities.")
+    incremental = _incremental_options(uploaded_file)
 
-    if st.button("Train All Models", type="primary"):
-        with st.spinner("Training models with cross-validation and hyperparameter tuning..."):
-            results = train_all_models(X, y, cv=cv_folds)
-            st.session_state['model_results'] = results
-            st.session_state['preprocessor'] = preprocessor
-            st.session_state['label_encoder'] = le
-            st.success("Training complete!")
+    run_in_background = st.sidebar.checkbox("Run in Background", value=True,
+                                            help="Train on the background job pool so the page stays responsive.")
 
-    if 'model_results' in st.session_state:
+    X, y, preprocessor, le = preprocess_data_cached(df, sparse=search_options['sparse'])
+    if issparse(X):
+        st.sidebar.caption(f"Feature matrix: {X.shape[0]:,} x {X.shape[1]:,} {X.dtype} CSR, {X.nnz:,} non-zeros, "
+                           f"{matrix_nbytes(X) / 2 ** 20:.1f} MB (dense: {dense_nbytes(X) / 2 ** 20:,.0f} MB)")
+
+    if 'job_notice' in st.session_state:
+        level, message = st.session_state.pop('job_notice')
+        getattr(st, level)(message)
+
+    if st.button("Train All Models", type="primary", disabled=bool(st.session_state.get('job_id'))):
+        if run_in_background:
+            st.session_state['job_id'] = submit_training(X, y, preprocessor, le, df, cv=cv_folds, search=search,
+                                                         incremental=incremental, **search_options)
+        else:
+            with st.spinner("Training models with cross-validation and hyperparameter tuning..."):
+                results = train_all_models(X, y, cv=cv_folds, search=search, frame=df, **search_options)
+                if incremental:
+                    results.update(train_incremental(**incremental))
+                st.session_state['model_results'] = results
+                st.session_state['preprocessor'] = preprocessor
+                st.session_state['label_encoder'] = le
+                st.session_state['registry_id'] = register(results, preprocessor, le, df)
+                st.success(f"Training complete! Saved to the model registry as `{st.session_state['registry_id']}`.")
+    elif not st.session_state.get('model_results') and warm_start(st.session_state, df):
+        st.info(f"Loaded models from the registry (`{st.session_state['registry_id']}`). Train again to refresh them.")
+
+    if st.session_state.get('job_id'):
+        _job_panel()
+    _job_table()
+
+    if st.session_state.get('model_results'):
         results = st.session_state['model_results']
         leaderboard = pd.DataFrame([{
             'Model': r['name'],
             'Best CV Score': r['best_score'],
             'CV Mean': r['cv_mean'],
             'CV Std': r['cv_std'],
+            'Fit Time (s)': r.get('fit_time'),
+            'Memory Bound (MB)': r.get('memory_bound_mb'),
+            'Recall vs Exact': r.get('recall'),
             'Best Params': str(r['best_params'])
         } for r in results.values()])
         st.subheader("Model Leaderboard")
         st.dataframe(leaderboard.sort_values('Best CV Score', ascending=False), use_container_width=True)
+        st.caption("Fit Time is the seconds spent fitting each model, summed over its CV fits; "
+                   "models share one process pool, so it is not their elapsed time.")
 
         fig = px.bar(leaderboard, x='Model', y='Best CV Score', color='Model', title="Model Comparison")
         fig.update_layout(title_x=0.5)
@@ -47,10 +105,94 @@ def show():
         selected_model = st.selectbox("Select model for details", list(results.keys()))
         res = results[selected_model]
         st.write(f"**Best Parameters:** {res['best_params']}")
+        if res.get('recall') is not None and 'KNN' in results:
+            exact = results['KNN']
+            st.caption(f"Approximate search finds {res['recall']:.1%} of the exact nearest neighbours; "
+                       f"CV score {res['best_score']:.4f} vs {exact['best_score']:.4f} for exact KNN.")
+        if res.get('search', {}).get('fold_aware'):
+            st.caption("Scored with preprocessing fitted inside each cross-validation fold.")
+        if res.get('calibration'):
+            st.caption(f"Probabilities calibrated ({res['calibration']['method']}) on "
+                       f"{res['calibration']['held_out_rows']:,} held-out rows.")
+        if res.get('search', {}).get('strategy') == 'halving':
+            st.write("**Halving Rounds:**")
+            st.dataframe(pd.DataFrame(res['search']['rounds']), use_container_width=True)
+            if res['search']['budget_exhausted']:
+                st.warning("Time budget reached before the final round; showing the best candidate so far.")
+        elif res.get('search', {}).get('strategy') == 'incremental':
+            st.caption(f"Trained out of core on {res['search']['rows']:,} rows. The score is progressive validation: "
+                       f"each batch was scored before the model learnt from it. Working set is bounded by "
+                       f"about {res['memory_bound_mb']:.0f} MB per chunk regardless of dataset size.")
 
-        if hasattr(res['model'], 'feature_importances_'):
+        model = base_model(res['model'])
+        if getattr(model, 'early_stopping', False) is True and hasattr(model, 'n_iter_'):
+            st.caption(f"Early stopping kept {model.n_iter_} of at most {model.max_iter} boosting iterations.")
+
+        if hasattr(model, 'feature_importances_'):
             try:
-                feature_names = list(res['model'].feature_names_in_)
+                feature_names = list(model.feature_names_in_)
             except AttributeError:
-                feature_names = [f"Feature {i}" for i in range(len(res['model'].feature_importances_))]
-            plot_feature_importance(res['model'].feature_importances_, feature_names, f"{selected_model} Feature Importance")
+                feature_names = [f"Feature {i}" for i in range(len(model.feature_importances_))]
+            plot_feature_importance(model.feature_importances_, feature_names, f"{selected_model} Feature Importance")
+
+
+def _incremental_options(uploaded_file):
+    """``train_incremental`` arguments from the sidebar, or None when incremental models are off."""
+    if not st.sidebar.checkbox("Add Incremental Models", value=False,
+                               help="Also train out-of-core models (SGD logistic regression, naive Bayes and an "
+                                    "approximate-kernel SVM) by streaming the CSV in chunks."):
+        return None
+    if uploaded_file is not None and not uploaded_file.name.endswith('.csv'):
+        st.sidebar.warning("Incremental training streams CSV files only.")
+        return None
+    chunksize = st.sidebar.number_input("Incremental Chunk Size (rows)", min_value=1_000, max_value=500_000,
+                                        value=INCREMENTAL_CHUNK_SIZE, step=5_000)
+    source = uploaded_file.getvalue() if uploaded_file is not None else str(DEFAULT_DATA_PATH)
+    return {'source': source, 'chunksize': int(chunksize)}
+
+
+def _attach(registry_id: str):
+    results, preprocessor, le = load_artifact(registry_id)
+    st.session_state['model_results'] = results
+    st.session_state['preprocessor'] = preprocessor
+    st.session_state['label_encoder'] = le
+    st.session_state['registry_id'] = registry_id
+
+
+@st.fragment(run_every=2)
+def _job_panel():
+    job = get_job(st.session_state['job_id'])
+    if job is None:
+        st.session_state.pop('job_id')
+        return
+    if job['status'] in ACTIVE_STATUSES:
+        fraction = job['done'] / job['total'] if job['total'] else 0.0
+        st.progress(fraction, text=f"Training job `{job['id']}` {job['status']}: {job['done']}/{job['total']} fits")
+        st.dataframe(job_progress(job['id']), use_container_width=True, hide_index=True)
+        if st.button("Cancel Training", disabled=bool(job['cancel_requested'])):
+            cancel(job['id'])
+        return
+    st.session_state.pop('job_id')
+    if job['status'] == 'done':
+        _attach(job['registry_id'])
+        st.session_state['job_notice'] = ('success', f"Training complete! Saved to the model registry as `{job['registry_id']}`.")
+    elif job['status'] == 'cancelled':
+        st.session_state['job_notice'] = ('warning', "Training job cancelled.")
+    else:
+        st.session_state['job_notice'] = ('error', f"Training job failed: {job['error']}")
+    st.rerun()
+
+
+def _job_table():
+    jobs = list_jobs()
+    if not jobs:
+        return
+    with st.expander("Training Jobs"):
+        st.dataframe(pd.DataFrame(jobs)[['id', 'status', 'done', 'total', 'options', 'registry_id', 'error']],
+                     use_container_width=True, hide_index=True)
+        finished = [j['registry_id'] for j in jobs if j['status'] == 'done']
+        if finished:
+            registry_id = st.selectbox("Finished runs", finished)
+            if st.button("Load Results"):
+                _attach(registry_id)
+                st.rerun()
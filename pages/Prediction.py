@@ -1,18 +1,49 @@
+import tempfile
+from pathlib import Path
 import streamlit as st
 import pandas as pd
 import numpy as np
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
 from utils.data_loader import load_data
-from utils.preprocessing import preprocess_data
+from utils.preprocessing import preprocess_data_cached
+from utils.scoring import score_file, BATCH_CHUNK_SIZE, DOWNLOAD_MAX_BYTES
+from models.registry import warm_start
+from models.fastpath import get_predictor
+
+
+# Rows of the loaded data a compiled predictor must match sklearn on before it is used.
+PARITY_SAMPLE_ROWS = 512
+
+
+def _fitted_preprocessing(df, result=None):
+    """Use the preprocessor and label encoder the model was trained with, falling back to ones fitted on ``df``.
+
+    Models trained on their own features (e.g. the incremental ones) carry them in
+    their result's ``preprocessor`` and ``label_encoder``; the rest share the session's.
+    """
+    if result is not None and result.get('preprocessor') is not None:
+        le = result.get('label_encoder') or st.session_state.get('label_encoder')
+        return result['preprocessor'], le if le is not None else preprocess_data_cached(df)[3]
+    if st.session_state.get('preprocessor') is not None:
+        return st.session_state['preprocessor'], st.session_state['label_encoder']
+    _, _, preprocessor, le = preprocess_data_cached(df)
+    return preprocessor, le
+
+
+def _compiled(df, preprocessor, model):
+    """Compiled fast path for ``model`` (None if it has none), parity-checked on a sample of ``df``."""
+    return get_predictor(preprocessor, model, df.drop('Churn', axis=1).head(PARITY_SAMPLE_ROWS))
 
 
 def show():
     st.title("Churn Prediction")
     uploaded_file = st.sidebar.file_uploader("Upload dataset", type=['csv', 'xlsx'], key="pred_upload")
-    df = load_data(uploaded_file=uploaded_file)
+    df = load_data(uploaded_file=uploaded_file, streaming=st.session_state.get('streaming_mode', False),
+                   compact=st.session_state.get('compact_mode', False))
     if df is None:
         return
 
-    if 'model_results' not in st.session_state:
+    if not warm_start(st.session_state, df) and not st.session_state.get('model_results'):
         st.warning("Please train models first on the Model Training page.")
         return
 
@@ -21,14 +52,19 @@ def show():
     selected = st.selectbox("Select Model", model_names)
     model = results[selected]['model']
 
+    mode = st.radio("Prediction Mode", ["Single Customer", "Batch File"], horizontal=True)
+    if mode == "Batch File":
+        show_batch(df, model, results[selected])
+        return
+
     st.subheader("Enter Customer Details")
     X = df.drop('Churn', axis=1)
     cols = st.columns(3)
     input_data = {}
     for i, col in enumerate(X.columns):
         with cols[i % 3]:
-            if X[col].dtype == 'object':
-                input_data[col] = st.selectbox(col, options=X[col].unique())
+            if not is_numeric_dtype(X[col]) or is_bool_dtype(X[col]):
+                input_data[col] = st.selectbox(col, options=X[col].dropna().unique())
             else:
                 min_val = float(X[col].min())
                 max_val = float(X[col].max())
@@ -37,13 +73,48 @@ def show():
     if st.button("Predict", type="primary"):
         input_df = pd.DataFrame([input_data])
         try:
-            _, _, preprocessor, le = preprocess_data(df)
-            processed = preprocessor.transform(input_df)
-            pred = model.predict(processed)[0]
-            proba = model.predict_proba(processed)[0][1] if hasattr(model, 'predict_proba') else None
+            preprocessor, le = _fitted_preprocessing(df, results[selected])
+            predictor = _compiled(df, preprocessor, model)
+            if predictor is not None:
+                row = predictor.predict_proba(input_df)[0]
+                pred, proba = predictor.classes_[np.argmax(row)], row[1]
+            else:
+                processed = preprocessor.transform(input_df)
+                pred = model.predict(processed)[0]
+                proba = model.predict_proba(processed)[0][1] if hasattr(model, 'predict_proba') else None
             churn_label = le.inverse_transform([pred])[0]
             st.success(f"Prediction: **{churn_label}**")
             if proba is not None:
                 st.metric("Churn Probability", f"{proba:.2%}")
+                calibration = results[selected].get('calibration')
+                if calibration:
+                    st.caption(f"Calibrated ({calibration['method']}) on {calibration['held_out_rows']:,} held-out rows.")
         except Exception as e:
             st.error(f"Prediction error: {str(e)}")
+
+
+def show_batch(df, model, result=None):
+    st.subheader("Batch Scoring")
+    batch_file = st.file_uploader("Upload customers to score", type=['csv', 'parquet', 'xlsx', 'xls'], key="batch_upload")
+    chunk_size = st.number_input("Chunk Size (rows)", min_value=1_000, max_value=500_000, value=BATCH_CHUNK_SIZE, step=10_000)
+    fmt = st.selectbox("Output Format", ["csv", "parquet"])
+    if batch_file is None or not st.button("Score File", type="primary"):
+        return
+
+    preprocessor, le = _fitted_preprocessing(df, result)
+    status = st.empty()
+    # The predictions file only lives until its bytes are handed to the download button, which keeps them
+    # in memory; ``DOWNLOAD_MAX_BYTES`` bounds that copy.
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = Path(tmp) / f"predictions.{fmt}"
+        try:
+            stats = score_file(batch_file, preprocessor, model, le, out_path, fmt=fmt, chunk_size=int(chunk_size),
+                               progress=lambda n: status.write(f"Scored {n:,} rows..."),
+                               predictor=_compiled(df, preprocessor, model), max_bytes=DOWNLOAD_MAX_BYTES)
+        except Exception as e:
+            st.error(f"Batch scoring error: {str(e)}")
+            return
+        data = out_path.read_bytes()
+    status.success(f"Scored {stats['rows']:,} rows in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec)")
+    st.download_button("Download Predictions", data, out_path.name,
+                       "text/csv" if fmt == 'csv' else "application/octet-stream")
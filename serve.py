@@ -0,0 +1,252 @@
+"""Standalone churn scoring service.
+
+Run with ``uvicorn serve:app --host 0.0.0.0 --port 8000``. The model is loaded
+once at startup from the model registry: ``TELCO_MODEL_ARTIFACT`` picks a
+registry id (default: newest) and ``TELCO_MODEL_NAME`` a model in it
+(default: best CV score).
+
+Endpoints:
+    POST /predict         one customer object, or a list of them
+    POST /predict/batch   {"customers": [...]}
+    GET  /health
+    GET  /metrics         Prometheus latency and batch-size histograms
+"""
+import asyncio
+import bisect
+import json
+import os
+import time
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from models.registry import read_manifest, read_artifact
+from models.fastpath import get_predictor
+from utils.preprocessing import ID_COLUMNS
+
+
+MAX_BATCH = int(os.environ.get('TELCO_MAX_BATCH', 256))
+MAX_WAIT_MS = float(os.environ.get('TELCO_MAX_WAIT_MS', 2))
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 250, 500, 1000]
+BATCH_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+# The churn label; ``churn_probability`` is this class's probability.
+POSITIVE_LABEL = 'Yes'
+
+
+class Histogram:
+    """Cumulative-bucket histogram in Prometheus exposition format."""
+
+    def __init__(self, name: str, help_text: str, buckets: List[float]):
+        self.name, self.help_text, self.buckets = name, help_text, buckets
+        self.counts = {}
+        self.sums = {}
+
+    def observe(self, value: float, label: str = ''):
+        counts = self.counts.setdefault(label, [0] * (len(self.buckets) + 1))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[label] = self.sums.get(label, 0.0) + value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label, counts in self.counts.items():
+            tag = f'endpoint="{label}",' if label else ''
+            total = 0
+            for bound, count in zip(self.buckets + ['+Inf'], counts):
+                total += count
+                lines.append(f'{self.name}_bucket{{{tag}le="{bound}"}} {total}')
+            lines.append(f"{self.name}_sum{{{tag.rstrip(',')}}} {self.sums[label]}")
+            lines.append(f"{self.name}_count{{{tag.rstrip(',')}}} {total}")
+        return "\n".join(lines) + "\n"
+
+
+LATENCY = Histogram('churn_request_latency_ms', 'Request latency in milliseconds.', LATENCY_BUCKETS_MS)
+BATCH_SIZE = Histogram('churn_model_batch_rows', 'Rows per predict_proba call.', BATCH_BUCKETS)
+
+
+def load_scorer() -> Tuple[str, str, Any, Any, Any]:
+    """Resolve ``(artifact_id, model_name, model, preprocessor, label_encoder)`` from the registry."""
+    entries = read_manifest()
+    if not entries:
+        raise RuntimeError("The model registry is empty; train models on the Model Training page first.")
+    artifact_id = os.environ.get('TELCO_MODEL_ARTIFACT') or entries[-1]['id']
+    results, preprocessor, le = read_artifact(artifact_id)
+    name = os.environ.get('TELCO_MODEL_NAME') or max(results, key=lambda n: results[n]['best_score'])
+    result = results[name]
+    return (artifact_id, name, result['model'], result.get('preprocessor') or preprocessor,
+            result.get('label_encoder') or le)
+
+
+class Scorer:
+    """Transforms and scores rows with a fitted preprocessor and model, through
+    their compiled equivalent when the model has one."""
+
+    def __init__(self, model, preprocessor, le):
+        self.model, self.preprocessor, self.le = model, preprocessor, le
+        self.predictor = get_predictor(preprocessor, model)
+        self.columns = list(preprocessor.feature_names_in_)
+        self.numeric_cols = next((cols for name, _, cols in preprocessor.transformers_ if name == 'num'), [])
+        self.required = [c for c in self.columns if c not in ID_COLUMNS]
+        # ``proba`` columns follow ``model.classes_`` (encoded labels), not the label order.
+        positive = np.flatnonzero(model.classes_ == le.transform([POSITIVE_LABEL])[0]) \
+            if POSITIVE_LABEL in le.classes_ else []
+        self.positive = int(positive[0]) if len(positive) else None
+
+    def validate(self, rows: List[Dict[str, Any]]):
+        """Raise ``ValueError`` for a row missing any feature the model was trained on (null values are imputed)."""
+        for i, row in enumerate(rows):
+            missing = [c for c in self.required if c not in row]
+            if missing:
+                raise ValueError(f"Customer {i} is missing required fields: {', '.join(missing)}.")
+
+    def score(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        frame = pd.DataFrame.from_records(rows).reindex(columns=self.columns)
+        for col in self.numeric_cols:
+            frame[col] = pd.to_numeric(frame[col], errors='coerce')
+        BATCH_SIZE.observe(len(rows))
+        if self.predictor is not None:
+            proba = self.predictor.predict_proba(frame)
+        elif hasattr(self.model, 'predict_proba'):
+            proba = self.model.predict_proba(self.preprocessor.transform(frame))
+        else:
+            # Margin-only models (e.g. the hinge-loss incremental SVM) give labels without probabilities.
+            labels = self.le.inverse_transform(self.model.predict(self.preprocessor.transform(frame)))
+            return [{'prediction': str(label), 'churn_probability': None} for label in labels]
+        labels = self.le.inverse_transform(self.model.classes_[np.argmax(proba, axis=1)])
+        churn = proba[:, self.positive] if self.positive is not None else [None] * len(labels)
+        return [{'prediction': str(label), 'churn_probability': None if p is None else float(p)}
+                for label, p in zip(labels, churn)]
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests into one ``predict_proba`` call.
+
+    A batch is flushed when it reaches ``MAX_BATCH`` rows or ``MAX_WAIT_MS``
+    after its first row arrived, whichever comes first.
+    """
+
+    def __init__(self, scorer: Scorer):
+        self.scorer = scorer
+        self.queue = asyncio.Queue()
+        self.worker = None
+
+    async def submit(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.worker is None:
+            self.worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            n_rows = len(pending[0][0])
+            deadline = loop.time() + MAX_WAIT_MS / 1000
+            while n_rows < MAX_BATCH:
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                n_rows += len(item[0])
+            # Clients that disconnected have cancelled futures; drop their rows.
+            pending = [(item_rows, future) for item_rows, future in pending if not future.done()]
+            if not pending:
+                continue
+            rows = [row for item_rows, _ in pending for row in item_rows]
+            try:
+                scored = await loop.run_in_executor(None, self.scorer.score, rows)
+            except Exception:
+                # Score each request alone so one bad request only fails its own client.
+                for item_rows, future in pending:
+                    try:
+                        result = await loop.run_in_executor(None, self.scorer.score, item_rows)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                continue
+            start = 0
+            for item_rows, future in pending:
+                if not future.done():
+                    future.set_result(scored[start:start + len(item_rows)])
+                start += len(item_rows)
+
+
+async def _read_json(receive) -> Any:
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return json.loads(body or b'null')
+
+
+async def _respond(send, status: int, payload: Any, content_type: bytes = b'application/json'):
+    body = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class ScoringApp:
+    """Minimal ASGI application; the model is loaded once on startup."""
+
+    def __init__(self):
+        self.batcher = None
+        self.info = {}
+
+    def startup(self):
+        artifact_id, name, model, preprocessor, le = load_scorer()
+        self.batcher = MicroBatcher(Scorer(model, preprocessor, le))
+        self.info = {'artifact': artifact_id, 'model': name}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    try:
+                        self.startup()
+                        await send({'type': 'lifespan.startup.complete'})
+                    except Exception as e:
+                        await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+        start = time.perf_counter()
+        method, path = scope['method'], scope['path'].rstrip('/')
+        if method == 'GET' and path == '/health':
+            await _respond(send, 200, {'status': 'ok', **self.info})
+        elif method == 'GET' and path == '/metrics':
+            await _respond(send, 200, LATENCY.render() + BATCH_SIZE.render(), b'text/plain; version=0.0.4')
+            return
+        elif method == 'POST' and path in ('/predict', '/predict/batch'):
+            try:
+                payload = await _read_json(receive)
+                if path == '/predict/batch':
+                    rows = payload['customers']
+                else:
+                    rows = payload if isinstance(payload, list) else [payload]
+                if not rows or not all(isinstance(row, dict) for row in rows):
+                    raise ValueError("Expected a customer object or a non-empty list of them.")
+                self.batcher.scorer.validate(rows)
+                scored = await self.batcher.submit(rows)
+            except (ValueError, KeyError, TypeError) as e:
+                await _respond(send, 400, {'error': str(e)})
+                return
+            except Exception as e:
+                await _respond(send, 500, {'error': str(e)})
+                return
+            await _respond(send, 200, {'predictions': scored} if path == '/predict/batch' or isinstance(payload, list)
+                           else scored[0])
+        else:
+            await _respond(send, 404, {'error': 'not found'})
+            return
+        LATENCY.observe((time.perf_counter() - start) * 1000, path)
+
+
+app = ScoringApp()
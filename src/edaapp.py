@@ -1,8 +1,18 @@
+import sys
+from pathlib import Path
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.cache import bytes_fingerprint
+from utils.kpis import kpi_frame
+from utils.sketches import frame_sketch, with_batch, append_batch
+from utils.visualizations import (
+    plot_histogram, plot_boxplot, plot_scatter, plot_churn_distribution, plot_churn_by_category, plot_churn_over_tenure
+)
+
 # Set page config
 st.set_page_config(page_title="Telco Churn Analysis Dashboard", layout="wide")
 
@@ -68,22 +78,18 @@ if page == "EDA Dashboard":
 
     # Monthly Charges Distribution
     st.markdown("<h3 class='fade-in'>Monthly Charges Distribution</h3>", unsafe_allow_html=True)
-    fig = px.histogram(df, x="MonthlyCharges", nbins=30, marginal="box")
-    fig.update_layout(title_text="Monthly Charges Distribution", title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    plot_histogram(df, "MonthlyCharges", "Monthly Charges Distribution")
 
     # Monthly Charges by Churn
     st.markdown("<h3 class='fade-in'>Monthly Charges by Churn</h3>", unsafe_allow_html=True)
-    fig = px.box(df, x="Churn", y="MonthlyCharges", color="Churn")
-    fig.update_layout(title_text="Monthly Charges by Churn", title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    plot_boxplot(df, "Churn", "MonthlyCharges", "Monthly Charges by Churn")
 
     # Total Charges vs. Monthly Charges
     st.markdown("<h3 class='fade-in'>Total Charges vs. Monthly Charges</h3>", unsafe_allow_html=True)
-    fig = px.scatter(df, x="MonthlyCharges", y="TotalCharges", color="Churn", 
-                     hover_data=["Contract", "tenure"])
-    fig.update_layout(title_text="Total Charges vs. Monthly Charges", title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    scatter_mode = st.radio("Large-data rendering", ["sample", "density"], horizontal=True,
+                            format_func=lambda m: {"sample": "Sampled points", "density": "Density heatmap"}[m])
+    plot_scatter(df, "MonthlyCharges", "TotalCharges", color="Churn", hover_data=["Contract", "tenure"],
+                 title="Total Charges vs. Monthly Charges", mode=scatter_mode)
 
     # Correlation heatmap
     st.markdown("<h3 class='fade-in'>Correlation Heatmap</h3>", unsafe_allow_html=True)
@@ -95,42 +101,50 @@ if page == "EDA Dashboard":
 
     # Churn distribution
     st.markdown("<h3 class='fade-in'>Churn Distribution</h3>", unsafe_allow_html=True)
-    fig = px.pie(df, names='Churn', title='Churn Distribution')
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    st.plotly_chart(fig, use_container_width=True)
+    plot_churn_distribution(df)
 
 elif page == "Analytics Dashboard":
     st.markdown("<h1 class='fade-in'>Analytics Dashboard</h1>", unsafe_allow_html=True)
 
-    # Key Performance Indicators (KPIs)
+    # Key Performance Indicators (KPIs), read from the dataset's persisted sketch
+    upload_key = f"upload-{bytes_fingerprint(uploaded_file.getvalue())}"
+    sketch = frame_sketch(df, dataset=upload_key)
+    batch_file = st.sidebar.file_uploader("Append monthly batch", type=['csv', 'xlsx', 'xls'], key="batch")
+    if batch_file is not None:
+        batch = load_data(batch_file)
+        if batch is not None:
+            # Previewed in this session; only "Commit batch" saves it for everyone.
+            batch_id = bytes_fingerprint(batch_file.getvalue())
+            if st.sidebar.button("Commit batch"):
+                sketch = append_batch(sketch, batch, batch_id=batch_id)
+                st.sidebar.success(f"Committed {len(batch):,} customers.")
+            else:
+                key = (sketch.dataset, sketch.n_rows, batch_id)
+                if st.session_state.get('batch_preview', (None,))[0] != key:
+                    st.session_state['batch_preview'] = (key, with_batch(sketch, batch, batch_id))
+                sketch = st.session_state['batch_preview'][1]
+                st.sidebar.caption(f"Previewing {len(batch):,} customers in this session only.")
+
     st.markdown("<h2 class='slide-in'>Key Metrics</h2>", unsafe_allow_html=True)
     
     col1, col2, col3 = st.columns(3)
     
     # Animated counters for KPIs
-    total_customers = len(df)
-    churned_customers = len(df[df["Churn"] == "Yes"])
-    churn_rate = churned_customers / total_customers * 100
-    avg_monthly_charges = df["MonthlyCharges"].mean()
-    avg_total_charges = df["TotalCharges"].mean()
-
-    col1.metric("Total Customers", f"{total_customers:,}")
-    col2.metric("Churned Customers", f"{churned_customers:,}")
-    col3.metric("Churn Rate (%)", f"{churn_rate:.2f}")
-    col1.metric("Avg Monthly Charges ($)", f"{avg_monthly_charges:.2f}")
-    col2.metric("Avg Total Charges ($)", f"{avg_total_charges:.2f}")
+    col1.metric("Total Customers", f"{sketch.n_rows:,}")
+    col2.metric("Churned Customers", f"{sketch.n_churned:,}")
+    col3.metric("Churn Rate (%)", f"{sketch.churn_rate * 100:.2f}")
+    col1.metric("Avg Monthly Charges ($)", f"{sketch.mean('MonthlyCharges'):.2f}")
+    col2.metric("Avg Total Charges ($)", f"{sketch.mean('TotalCharges'):.2f}")
+    if sketch.batches:
+        col3.metric("Appended Batches", len(sketch.batches))
 
     # Churn by Contract Type
     st.markdown("<h3 class='fade-in'>Churn by Contract Type</h3>", unsafe_allow_html=True)
-    contract_churn = df.groupby("Contract")["Churn"].value_counts(normalize=True).unstack()
-    fig = px.bar(contract_churn, x=contract_churn.index, y=["Yes", "No"], 
-                 title="Churn Rate by Contract Type", barmode="group")
-    fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    plot_churn_by_category(sketch, "Contract", "Churn Rate by Contract Type")
 
     # Top 5 Reasons for Churn
     st.markdown("<h3 class='fade-in'>Top 5 Reasons for Churn</h3>", unsafe_allow_html=True)
-    churn_reasons = df[df["Churn"] == "Yes"].groupby("Contract").size().sort_values(ascending=False).head()
+    churn_reasons = sketch.category_churn("Contract")['churned'].sort_values(ascending=False).head()
     fig = px.pie(values=churn_reasons.values, names=churn_reasons.index, 
                  title="Top 5 Reasons for Churn")
     fig.update_traces(textposition='inside', textinfo='percent+label')
@@ -139,11 +153,23 @@ elif page == "Analytics Dashboard":
 
     # Churn Rate Over Time
     st.markdown("<h3 class='fade-in'>Churn Rate Over Time</h3>", unsafe_allow_html=True)
-    churn_over_time = df.groupby('tenure')['Churn'].apply(lambda x: (x == 'Yes').mean()).reset_index()
-    churn_over_time.columns = ['tenure', 'ChurnRate']
-    fig = px.line(churn_over_time, x='tenure', y='ChurnRate', title='Churn Rate Over Time')
-    fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    plot_churn_over_tenure(sketch, title='Churn Rate Over Time')
+
+    # Churn KPIs grouped by any columns, one vectorised pass per selection
+    st.markdown("<h3 class='fade-in'>Group KPIs</h3>", unsafe_allow_html=True)
+    kpis = kpi_frame(df, key=upload_key)
+    group_options = kpis.group_columns()
+    group_by = st.multiselect("Group by", group_options,
+                              default=[c for c in ["Contract"] if c in group_options])
+    value_cols = [c for c in ["MonthlyCharges", "TotalCharges"] if c in df.columns]
+    groups = kpis.aggregate(group_by, values=value_cols)
+    if group_by:
+        labels = groups.index.to_flat_index().map(lambda k: " / ".join(map(str, k)) if isinstance(k, tuple) else str(k))
+        fig = px.bar(x=labels, y=groups['churn_rate'].to_numpy(), labels={'x': ", ".join(group_by), 'y': 'Churn Rate'},
+                     title=f"Churn Rate by {', '.join(group_by)}")
+        fig.update_layout(title_x=0.5)
+        st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(groups.round(4), use_container_width=True)
 
     # Interactive Churn Predictor
     st.markdown("<h3 class='fade-in'>Interactive Churn Predictor</h3>", unsafe_allow_html=True)
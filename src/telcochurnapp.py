@@ -9,7 +9,6 @@ from sklearn.preprocessing import LabelEncoder, StandardScaler, OneHotEncoder
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from scipy.sparse import csr_matrix
 
 # Streamlit page configuration
 st.set_page_config(
@@ -72,8 +71,7 @@ def preprocess_data(data):
 # Train multiple models and return the selected one
 @st.cache_data
 def train_models(_X, y):
-    X = csr_matrix(_X) if isinstance(_X, csr_matrix) else _X
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_train, X_test, y_train, y_test = train_test_split(_X, y, test_size=0.2, random_state=42)
     
     models = {
         "Random Forest": RandomForestClassifier(random_state=42),
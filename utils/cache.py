@@ -0,0 +1,136 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Hashable, Optional
+import pandas as pd
+
+
+CACHE_DIR = Path(os.environ.get('TELCO_CACHE_DIR', Path(__file__).parent.parent / 'cache'))
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """Fast content hash of a DataFrame plus its column schema."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def frame_key(df: pd.DataFrame) -> str:
+    """Content key of ``df``: the fingerprint ``load_data`` stamps in ``attrs`` plus the
+    shape and columns (attrs follow derived frames), else a full ``frame_fingerprint``."""
+    fingerprint = df.attrs.get('fingerprint')
+    if fingerprint is None:
+        return frame_fingerprint(df)
+    return f"{fingerprint}-{bytes_fingerprint(repr((df.shape, [str(c) for c in df.columns])).encode())[:8]}"
+
+
+def bytes_fingerprint(data: bytes) -> str:
+    """Content hash of raw file bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU map shared by every session in the process."""
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskStore:
+    """Directory of content-addressed entries, one sub-directory per key."""
+
+    def __init__(self, name: str, root: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.root = Path(root or CACHE_DIR) / name
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_dir()
+
+    def load(self, key: str, reader: Callable[[Path], Any]) -> Optional[Any]:
+        """Read an entry with ``reader``; a corrupt entry is dropped and treated as a miss."""
+        path = self.path(key)
+        if not path.is_dir():
+            return None
+        try:
+            value = reader(path)
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        os.utime(path)
+        return value
+
+    def save(self, key: str, writer: Callable[[Path], None]):
+        """Write an entry with ``writer`` into a temp dir and publish it atomically."""
+        path = self.path(key)
+        if path.is_dir():
+            return
+        tmp = self.root / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp.mkdir(parents=True, exist_ok=True)
+        try:
+            writer(tmp)
+            os.replace(tmp, path)
+            self.evict()
+        except OSError:
+            # Another session published the same key first.
+            shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def _entries(self):
+        if not self.root.is_dir():
+            return []
+        return [p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith('.')]
+
+    def size(self) -> int:
+        return sum(_dir_size(p) for p in self._entries())
+
+    def evict(self):
+        """Drop least recently used entries until the store fits in ``max_bytes``."""
+        if self.max_bytes is None:
+            return
+        entries = sorted((p.stat().st_mtime, _dir_size(p), p) for p in self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
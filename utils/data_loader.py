@@ -1,44 +1,246 @@
 import streamlit as st
 import pandas as pd
 import os
-from typing import Optional, Tuple
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
+from pandas.api.types import (
+    union_categoricals, is_bool_dtype, is_integer_dtype, is_float_dtype, is_object_dtype, is_string_dtype
+)
+from utils.cache import DiskStore, bytes_fingerprint, frame_fingerprint
+from utils.instrumentation import profiled
+from utils.store import get_store, shared
 
 
-@st.cache_data
-def load_data(file_path: Optional[str] = None, uploaded_file=None) -> Optional[pd.DataFrame]:
-    """Load dataset from file path or uploaded file."""
+DEFAULT_DATA_PATH = Path(__file__).parent.parent / 'data' / 'CleanedTelco.csv'
+CHUNK_SIZE = 100_000
+UPLOAD_CACHE_MAX_BYTES = int(os.environ.get('TELCO_UPLOAD_CACHE_MB', 2048)) * 2 ** 20
+
+_UPLOAD_STORE = DiskStore('uploads', max_bytes=UPLOAD_CACHE_MAX_BYTES)
+
+SERVICE_COLUMNS = ['MultipleLines', 'OnlineSecurity', 'OnlineBackup', 'DeviceProtection',
+                   'TechSupport', 'StreamingTV', 'StreamingMovies']
+
+# Explicit Telco schema for streaming reads. Yes/No flags become nullable booleans;
+# service columns stay categorical because they also carry "No internet service".
+TELCO_SCHEMA = {
+    'gender': 'category',
+    'SeniorCitizen': 'int8',
+    'Partner': 'boolean',
+    'Dependents': 'boolean',
+    'tenure': 'int16',
+    'PhoneService': 'boolean',
+    'InternetService': 'category',
+    **{col: 'category' for col in SERVICE_COLUMNS},
+    'Contract': 'category',
+    'PaperlessBilling': 'boolean',
+    'PaymentMethod': 'category',
+    'MonthlyCharges': 'float32',
+    'TotalCharges': 'object',
+    'Churn': 'category'
+}
+TRUE_VALUES = ['Yes', 'True', 'true']
+FALSE_VALUES = ['No', 'False', 'false']
+
+
+def stream_data(source, chunksize: int = CHUNK_SIZE, names: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Yield cleaned chunks of a Telco CSV read with ``TELCO_SCHEMA``.
+
+    With ``names`` the source has no header line (e.g. rows appended after one).
+    """
+    reader = pd.read_csv(source, dtype=TELCO_SCHEMA, true_values=TRUE_VALUES, false_values=FALSE_VALUES,
+                         chunksize=chunksize, names=names, header=None if names else 'infer')
+    for chunk in reader:
+        chunk['TotalCharges'] = pd.to_numeric(chunk['TotalCharges'], errors='coerce').astype('float32')
+        yield chunk.dropna(subset=['TotalCharges'])
+
+
+def _concat_chunks(chunks) -> pd.DataFrame:
+    """Concatenate chunks, unioning categories so categorical columns stay categorical."""
+    if len(chunks) == 1:
+        return chunks[0]
+    df = pd.concat(chunks, ignore_index=True)
+    for col, dtype in chunks[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[col] = union_categoricals([c[col] for c in chunks])
+    return df
+
+
+def load_data_streaming(source, chunksize: int = CHUNK_SIZE, track_memory: bool = False) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """Load a Telco CSV chunk by chunk and report rows/sec, the frame's size and peak memory.
+
+    ``peak_mb`` is the chunks plus the concatenated frame, both held while they
+    are joined; with ``track_memory`` it is measured by ``tracemalloc`` instead
+    (parser buffers included), which roughly doubles the load time.
+
+    Chunks bound the parser's working set, not the result: every chunk is
+    concatenated into one frame, so a file whose typed frame does not fit in
+    memory still fails. ``stream_data`` is the bounded alternative.
+    """
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        chunks = list(stream_data(source, chunksize))
+        df = _concat_chunks(chunks)
+        frame_bytes = df.memory_usage(deep=True).sum()
+        held = frame_bytes + (sum(c.memory_usage(deep=True).sum() for c in chunks) if len(chunks) > 1 else 0)
+        del chunks
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if track_memory else held
+    finally:
+        if track_memory:
+            tracemalloc.stop()
+    stats = {
+        'rows': len(df),
+        'seconds': seconds,
+        'rows_per_sec': len(df) / seconds if seconds else float('nan'),
+        'peak_mb': peak / 1e6,
+        'frame_mb': frame_bytes / 1e6
+    }
+    return df, stats
+
+
+def _read_source(source, name: str, streaming: bool = False) -> pd.DataFrame:
+    """Parse a CSV or Excel source into a frame with ``TotalCharges`` cleaned."""
+    if streaming and name.endswith('.csv'):
+        df, stats = load_data_streaming(source)
+        df.attrs['ingest_stats'] = stats
+        return df
+    df = pd.read_csv(source) if name.endswith('.csv') else pd.read_excel(source)
+    df['TotalCharges'] = pd.to_numeric(df['TotalCharges'], errors='coerce')
+    df = df.dropna(subset=['TotalCharges'])
+    return df
+
+
+def _read_columnar(path: Path) -> pd.DataFrame:
+    from pyarrow import feather
+    return feather.read_table(path / 'data.feather', memory_map=True).to_pandas()
+
+
+def _write_columnar(path: Path, df: pd.DataFrame):
+    df.reset_index(drop=True).to_feather(path / 'data.feather', compression='uncompressed')
+
+
+def load_upload_columnar(uploaded_file, streaming: bool = False) -> pd.DataFrame:
+    """Parse an upload once into a typed Feather file keyed by its content hash.
+
+    Later loads of the same bytes, from any page, session or process, memory-map
+    that file instead of parsing CSV or Excel again.
+    """
+    key = f"{bytes_fingerprint(uploaded_file.getvalue())}-{'typed' if streaming else 'raw'}"
+    df = _UPLOAD_STORE.load(key, _read_columnar)
+    if df is not None:
+        return df
+    df = _read_source(uploaded_file, uploaded_file.name, streaming)
+    try:
+        _UPLOAD_STORE.save(key, lambda path: _write_columnar(path, df))
+    except (TypeError, ValueError, ImportError):
+        # Columns Arrow cannot type (e.g. mixed objects) are served uncached.
+        pass
+    return df
+
+
+def compact_frame(df: pd.DataFrame, max_category_ratio: float = 0.5) -> pd.DataFrame:
+    """Downcast to category/int8/float32.
+
+    Low-cardinality string columns become ``category`` (labels are kept, so
+    ``df['Churn'] == 'Yes'`` still works) and integers take the smallest signed
+    type, both without changing any values. Floats become ``float32``, which
+    rounds them to about 7 significant digits. Columns that are already compact are
+    shared with ``df``, not copied. A before/after memory report is stored in
+    ``attrs['memory_report']``.
+    """
+    dtypes = {}
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype) or is_bool_dtype(s):
+            continue
+        if is_integer_dtype(s) and not isinstance(s.dtype, pd.api.extensions.ExtensionDtype):
+            dtype = pd.to_numeric(s, downcast='integer').dtype
+        elif is_float_dtype(s):
+            dtype = 'float32'
+        elif (is_object_dtype(s) or is_string_dtype(s)) and s.nunique() <= max_category_ratio * len(s):
+            dtype = 'category'
+        else:
+            continue
+        if dtype != s.dtype:
+            dtypes[col] = dtype
+    before = df.memory_usage(deep=True, index=False)
+    compact = df.astype(dtypes) if dtypes else df.copy(deep=False)
+    compact.attrs = {**df.attrs, 'memory_report': memory_report(before, compact.memory_usage(deep=True, index=False))}
+    return compact
+
+
+def memory_report(before: pd.Series, after: pd.Series) -> Dict[str, object]:
+    """Summarise per-column memory (bytes) before and after compaction."""
+    return {
+        'before_mb': before.sum() / 1e6,
+        'after_mb': after.sum() / 1e6,
+        'ratio': before.sum() / max(after.sum(), 1),
+        'columns': {col: (int(before[col]), int(after[col])) for col in before.index}
+    }
+
+
+def _frame_key(file_path: Optional[str], uploaded_file, streaming: bool, compact: bool) -> Optional[str]:
+    """Store key for the frame ``load_data`` would build: upload bytes or path and mtime, plus options."""
+    options = f"{'typed' if streaming else 'raw'}-{'compact' if compact else 'full'}"
+    if uploaded_file is not None:
+        return f"frame:upload:{bytes_fingerprint(uploaded_file.getvalue())}:{options}"
+    path = Path(file_path) if file_path and Path(file_path).exists() else DEFAULT_DATA_PATH
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return f"frame:{path.resolve()}:{stat.st_mtime_ns}-{stat.st_size}:{options}"
+
+
+def _load_frame(file_path: Optional[str], uploaded_file, streaming: bool, compact: bool) -> Optional[pd.DataFrame]:
     try:
         if uploaded_file is not None:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            elif uploaded_file.name.endswith(('.xls', '.xlsx')):
-                df = pd.read_excel(uploaded_file)
-            else:
-                st.error("Unsupported file format. Use CSV or Excel.")
-                return None
+            df = load_upload_columnar(uploaded_file, streaming)
         elif file_path and Path(file_path).exists():
-            df = pd.read_csv(file_path) if file_path.endswith('.csv') else pd.read_excel(file_path)
+            df = _read_source(file_path, file_path, streaming)
         else:
-            default_path = Path(__file__).parent.parent / 'data' / 'CleanedTelco.csv'
-            if default_path.exists():
-                df = pd.read_csv(default_path)
-            else:
-                st.error("Default dataset not found. Please upload a file.")
-                return None
-        df['TotalCharges'] = pd.to_numeric(df['TotalCharges'], errors='coerce')
-        df = df.dropna(subset=['TotalCharges'])
+            df = _read_source(DEFAULT_DATA_PATH, str(DEFAULT_DATA_PATH), streaming)
+        df = compact_frame(df) if compact else df
+        df.attrs['fingerprint'] = frame_fingerprint(df)
         return df
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
         return None
 
 
+@profiled
+def load_data(file_path: Optional[str] = None, uploaded_file=None, streaming: bool = False,
+              compact: bool = False) -> Optional[pd.DataFrame]:
+    """Load dataset from file path or uploaded file.
+
+    Uploads go through the columnar cache. With ``streaming`` CSVs are read in
+    chunks with ``TELCO_SCHEMA`` and the ingestion stats are kept in
+    ``df.attrs['ingest_stats']``. With ``compact`` the frame is downcast by
+    ``compact_frame``.
+
+    The frame is held once in the shared store and returned to every session
+    that loads the same source, so callers must not mutate it.
+    """
+    if uploaded_file is not None and not uploaded_file.name.endswith(('.csv', '.xls', '.xlsx')):
+        st.error("Unsupported file format. Use CSV or Excel.")
+        return None
+    key = _frame_key(file_path, uploaded_file, streaming, compact)
+    if key is None:
+        st.error("Default dataset not found. Please upload a file.")
+        return None
+    return shared(key, 'frame', lambda: _load_frame(file_path, uploaded_file, streaming, compact))
+
+
+# Drops unheld frames, so the next load reads the source again (benchmarks time cold loads).
+load_data.clear = lambda: get_store().clear('frame')
+
+
 def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     """Clean and prepare the dataset."""
-    df = df.copy()
-    df = df.drop('customerID', axis=1, errors='ignore')
-    return df
+    return df.drop('customerID', axis=1, errors='ignore')
 
 
 def get_feature_target_split(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
@@ -0,0 +1,144 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+RING_SIZE = int(os.environ.get('TELCO_PERF_RING_SIZE', 500))
+SESSION_KEY = 'perf_records'
+
+# Records made outside a Streamlit script run (background jobs, the scoring
+# service, benchmarks) go to one process-wide buffer instead of a session's.
+_FALLBACK = deque(maxlen=RING_SIZE)
+_local = threading.local()
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _rss_bytes() -> Optional[int]:
+    """Current resident set size; only available where /proc is (Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def get_buffer() -> deque:
+    """The ring buffer of the current session, or the process-wide fallback."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except ImportError:
+        ctx = None
+    if ctx is None:
+        return _FALLBACK
+    import streamlit as st
+    if SESSION_KEY not in st.session_state:
+        st.session_state[SESSION_KEY] = deque(maxlen=RING_SIZE)
+    return st.session_state[SESSION_KEY]
+
+
+def _rows(value) -> Optional[int]:
+    shape = getattr(value, 'shape', None)
+    if shape:
+        return int(shape[0])
+    if isinstance(value, tuple) and value:
+        return _rows(value[0])
+    return None
+
+
+@contextmanager
+def profile_span(name: str, category: str = 'app', **meta) -> Iterator[Dict[str, Any]]:
+    """Time a block and record it in the ring buffer.
+
+    Yields the record so the block can add fields such as ``rows``. Nested spans
+    are recorded with their depth; exceptions are recorded and re-raised.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    record = {'name': name, 'category': category, 'start': time.time(), 'depth': len(stack),
+              'pid': os.getpid(), 'tid': threading.get_ident(), 'rows': None, **meta}
+    rss_before = _rss_bytes()
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['duration_ms'] = (time.perf_counter() - start) * 1000
+        stack.pop()
+        rss_after = _rss_bytes()
+        record['mem_delta_mb'] = (rss_after - rss_before) / 2 ** 20 if rss_before is not None and rss_after is not None else None
+        get_buffer().append(record)
+
+
+def profiled(fn: Optional[Callable] = None, *, name: Optional[str] = None):
+    """Decorator form of ``profile_span``.
+
+    The row count is taken from the result (a frame, array or tuple starting
+    with one) or else from the first argument. Can wrap ``st.cache_data``
+    functions, whose ``clear`` stays available.
+    """
+    def decorate(fn: Callable) -> Callable:
+        label = name or getattr(fn, '__name__', repr(fn))
+        category = getattr(fn, '__module__', None) or 'app'
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profile_span(label, category) as record:
+                result = fn(*args, **kwargs)
+                record['rows'] = _rows(result) or (_rows(args[0]) if args else None)
+                return result
+
+        if hasattr(fn, 'clear'):
+            wrapper.clear = fn.clear
+        return wrapper
+
+    return decorate(fn) if fn is not None else decorate
+
+
+def chrome_trace(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Records as Chrome trace JSON (chrome://tracing, Perfetto)."""
+    events = []
+    for r in records:
+        args = {k: r[k] for k in ('rows', 'mem_delta_mb', 'error') if r.get(k) is not None}
+        events.append({'name': r['name'], 'cat': r['category'], 'ph': 'X', 'ts': r['start'] * 1e6,
+                       'dur': r['duration_ms'] * 1e3, 'pid': r['pid'], 'tid': r['tid'], 'args': args})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def show_performance_panel(recent: int = 25):
+    """Sidebar panel: per-function totals, the latest spans and a trace export."""
+    import pandas as pd
+    import streamlit as st
+
+    buffer = get_buffer()
+    st.subheader("Performance")
+    if not buffer:
+        st.caption("No timings recorded yet.")
+        return
+    records = list(buffer)
+    frame = pd.DataFrame(records)
+    summary = frame.groupby('name')['duration_ms'].agg(['count', 'sum', 'mean', 'max']) \
+        .sort_values('sum', ascending=False).round(1)
+    summary.columns = ['Calls', 'Total (ms)', 'Mean (ms)', 'Max (ms)']
+    st.dataframe(summary)
+
+    latest = frame.tail(recent).iloc[::-1]
+    st.dataframe(pd.DataFrame({
+        'Span': ['· ' * d + n for d, n in zip(latest['depth'], latest['name'])],
+        'ms': latest['duration_ms'].round(1),
+        'Rows': pd.to_numeric(latest['rows'], errors='coerce').astype('Int64'),
+        'Mem Δ (MB)': pd.to_numeric(latest['mem_delta_mb'], errors='coerce').round(1)
+    }), hide_index=True)
+
+    st.download_button("Export Chrome Trace", json.dumps(chrome_trace(records)), "trace.json", "application/json")
+    if st.button("Clear Timings"):
+        buffer.clear()
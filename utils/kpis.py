@@ -0,0 +1,158 @@
+# Grouped churn KPIs
+"""Churn KPIs grouped by any columns, in one vectorised pass.
+
+``KPIFrame`` prepares a frame once: boolean churned/labelled arrays and, on
+first use, an integer code array per group-by column. Categoricals reuse
+their codes and small integer ranges (``tenure``) are offset; anything else
+is factorised once. ``KPIFrame.aggregate`` folds the codes of the chosen
+columns into one mixed-radix group id and gets every statistic from
+``np.bincount``. No Python code runs per group or per row.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from utils.cache import LRUCache, frame_fingerprint
+from utils.data_loader import TRUE_VALUES
+
+
+MISSING_LEVEL = '(missing)'
+# Integer columns spanning at most this many values are coded by offset instead of factorised.
+MAX_INT_RANGE = 10_000
+# Group-by columns offered in the UI: at most this many distinct values.
+MAX_GROUP_LEVELS = 1_000
+COUNT_COLUMNS = ['customers', 'labelled', 'churned']
+
+_KPI_FRAMES = LRUCache(maxsize=8)
+
+
+def churn_flags(churn: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """``(churned, labelled)`` boolean arrays for a Churn column of any dtype."""
+    if isinstance(churn.dtype, pd.CategoricalDtype):
+        codes = churn.cat.codes.to_numpy()
+        yes = np.append(churn.cat.categories.astype(str).isin(TRUE_VALUES), False)
+        return yes[codes], codes >= 0
+    labelled = churn.notna().to_numpy()
+    if churn.dtype == bool or str(churn.dtype) == 'boolean':
+        return churn.fillna(False).to_numpy(dtype=bool), labelled
+    return churn.astype(str).isin(TRUE_VALUES).to_numpy() & labelled, labelled
+
+
+def group_codes(values: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    """``(codes, labels)``: codes index ``labels``; missing values get the last code, ``MISSING_LEVEL``."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, labels = values.cat.codes.to_numpy().astype(np.int64), values.cat.categories
+    elif pd.api.types.is_integer_dtype(values) and not pd.api.types.is_bool_dtype(values) and values.notna().any() \
+            and values.max() - values.min() < MAX_INT_RANGE:
+        low, high = int(values.min()), int(values.max())
+        codes = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(codes)
+        codes = np.where(missing, -1, codes - low).astype(np.int64)
+        labels = pd.RangeIndex(low, high + 1)
+    else:
+        codes, labels = pd.factorize(values, sort=True)
+        codes = codes.astype(np.int64)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(labels), codes)
+        labels = pd.Index(list(labels) + [MISSING_LEVEL], dtype=object)
+    return codes, pd.Index(labels)
+
+
+class KPIFrame:
+    """A frame prepared for grouped churn KPIs (see the module docstring).
+
+    Holds references to the frame's columns, not copies; codes are cached per column.
+    """
+
+    def __init__(self, df: pd.DataFrame, churned: Optional[np.ndarray] = None, labelled: Optional[np.ndarray] = None):
+        self.df = df
+        n = len(df)
+        if churned is not None:
+            self.churned, self.labelled = churned, labelled
+        elif 'Churn' in df:
+            self.churned, self.labelled = churn_flags(df['Churn'])
+        else:
+            self.churned, self.labelled = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+        self._codes: Dict[str, Tuple[np.ndarray, pd.Index]] = {}
+
+    def codes(self, column: str) -> Tuple[np.ndarray, pd.Index]:
+        if column not in self._codes:
+            self._codes[column] = group_codes(self.df[column])
+        return self._codes[column]
+
+    def group_columns(self, max_levels: int = MAX_GROUP_LEVELS) -> List[str]:
+        """Columns that make sensible groups: categorical-like, or integers with few distinct values."""
+        columns = []
+        for col in self.df.columns:
+            s = self.df[col]
+            if col == 'Churn' or pd.api.types.is_float_dtype(s):
+                continue
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                levels = len(s.cat.categories)
+            elif pd.api.types.is_integer_dtype(s) and not pd.api.types.is_bool_dtype(s):
+                levels = s.max() - s.min() + 1 if s.notna().any() else 0
+            else:
+                levels = s.nunique()
+            if 0 < levels <= max_levels:
+                columns.append(col)
+        return columns
+
+    def aggregate(self, by: Sequence[str], values: Sequence[str] = (), mask: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Customers, labelled, churned, churn rate and the mean of each of ``values`` per group of ``by``.
+
+        Only non-empty groups are returned, indexed by the ``by`` labels. ``mask``
+        restricts the rows. An empty ``by`` gives a single overall row.
+        """
+        group, dims, labels = np.zeros(len(self.df), dtype=np.int64), [], []
+        for col in by:
+            codes, levels = self.codes(col)
+            group = group * len(levels) + codes
+            dims.append(len(levels))
+            labels.append(levels)
+        n_groups = int(np.prod([float(d) for d in dims])) if dims else 1
+        if n_groups >= 2 ** 62:
+            raise ValueError(f"Too many group combinations for {list(by)}.")
+        churned, labelled = self.churned, self.labelled
+        if mask is not None:
+            group, churned, labelled = group[mask], churned[mask], labelled[mask]
+        compact = n_groups > 4 * max(len(group), 1)
+        if compact:
+            # Too many combinations for dense bins: count only the ones present.
+            present, group = np.unique(group, return_inverse=True)
+            n_bins = len(present)
+        else:
+            n_bins = n_groups
+        stats = {
+            'customers': np.bincount(group, minlength=n_bins),
+            'labelled': np.bincount(group[labelled], minlength=n_bins),
+            'churned': np.bincount(group[churned], minlength=n_bins)
+        }
+        for col in values:
+            v = self.df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            v = v[mask] if mask is not None else v
+            known = ~np.isnan(v)
+            stats[f'avg_{col}'] = np.bincount(group[known], weights=v[known], minlength=n_bins) / \
+                np.maximum(np.bincount(group[known], minlength=n_bins), 1)
+        keep = np.flatnonzero(stats['customers'])
+        out = pd.DataFrame({k: v[keep] for k, v in stats.items()})
+        out.insert(3, 'churn_rate', out['churned'] / out['labelled'].where(out['labelled'] > 0))
+        ids = present[keep] if compact else keep
+        if len(by) == 1:
+            out.index = pd.Index(labels[0][ids], name=by[0])
+        elif by:
+            positions = np.unravel_index(ids, dims)
+            out.index = pd.MultiIndex.from_arrays([lv[p] for lv, p in zip(labels, positions)], names=list(by))
+        return out
+
+
+def kpi_frame(df: pd.DataFrame, key: Optional[str] = None) -> KPIFrame:
+    """The prepared ``KPIFrame`` for ``df``, shared by every rerun and session that shows it.
+
+    ``key`` identifies the data (e.g. the upload's hash); by default the
+    frame's fingerprint is used, which hashes it unless ``load_data`` did.
+    """
+    key = (key or df.attrs.get('fingerprint') or frame_fingerprint(df), df.shape)
+    prepared = _KPI_FRAMES.get(key)
+    if prepared is None:
+        prepared = KPIFrame(df)
+        _KPI_FRAMES.put(key, prepared)
+    return prepared
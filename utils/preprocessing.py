@@ -5,36 +5,152 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.impute import SimpleImputer
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder
-from scipy.sparse import csr_matrix
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, FunctionTransformer
+from scipy.sparse import csr_matrix, issparse, save_npz, load_npz
+import joblib
+import os
+import sklearn
+from utils.cache import DiskStore, frame_key
+from utils.instrumentation import profiled
+from utils.sparsity import as_float32_csr
 
 
-def preprocess_data(df: pd.DataFrame) -> Tuple[csr_matrix, np.ndarray, ColumnTransformer, LabelEncoder]:
-    """Preprocess data with pipelines."""
-    df = df.copy()
-    X = df.drop('Churn', axis=1)
-    y = df['Churn']
+# Bump when the fitted preprocessing changes, so cached matrices and pickled transformers go stale.
+PREPROCESS_VERSION = 3
+PREPROCESS_CACHE_MAX_BYTES = int(os.environ.get('TELCO_PREPROCESS_CACHE_MB', 2048)) * 2 ** 20
+
+_PREPROCESS_STORE = DiskStore('preprocess', max_bytes=PREPROCESS_CACHE_MAX_BYTES)
+
+# Unique per customer, so useless as a native categorical (and far above its 255-level cap).
+ID_COLUMNS = ['customerID']
+# Most levels a native categorical can have; rarer ones are grouped as infrequent.
+MAX_NATIVE_CATEGORIES = 255
+
 
-    numeric_cols = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
-    categorical_cols = X.select_dtypes(include=['object']).columns.tolist()
+def _as_str(X):
+    """Give categorical, boolean and string columns one string representation, keeping missing values."""
+    X = pd.DataFrame(X)
+    return X.astype(str).where(X.notna(), np.nan)
+
+
+def build_preprocessor(X: pd.DataFrame, sparse: bool = False) -> ColumnTransformer:
+    """Unfitted preprocessor for the feature columns of ``X``: numeric columns are
+    imputed and scaled, everything else is one-hot encoded.
+
+    By default the output is only sparse while its overall density stays under
+    30%; a dataset with fewer categorical levels silently comes out dense. With
+    ``sparse`` the output is always CSR, one-hot columns are float32 and numeric
+    columns are scaled without centering, so a zero stays a zero.
+    """
+    numeric_cols = X.select_dtypes(include='number').columns.tolist()
+    categorical_cols = [c for c in X.columns if c not in numeric_cols]
 
     numeric_transformer = Pipeline(steps=[
         ('imputer', SimpleImputer(strategy='median')),
-        ('scaler', StandardScaler())
+        ('scaler', StandardScaler(with_mean=not sparse))
     ])
 
     categorical_transformer = Pipeline(steps=[
+        ('to_str', FunctionTransformer(_as_str, feature_names_out='one-to-one')),
         ('imputer', SimpleImputer(strategy='constant', fill_value='missing')),
-        ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=True))
+        ('onehot', OneHotEncoder(handle_unknown='ignore', sparse_output=True,
+                                 dtype=np.float32 if sparse else np.float64))
     ])
 
-    preprocessor = ColumnTransformer(transformers=[
+    return ColumnTransformer(transformers=[
         ('num', numeric_transformer, numeric_cols),
         ('cat', categorical_transformer, categorical_cols)
+    ], sparse_threshold=1.0 if sparse else 0.3)
+
+
+def build_sparse_preprocessor(X: pd.DataFrame) -> ColumnTransformer:
+    """``build_preprocessor`` in sparse-native mode (a named builder for fold-aware sweeps)."""
+    return build_preprocessor(X, sparse=True)
+
+
+def build_ordinal_preprocessor(X: pd.DataFrame) -> ColumnTransformer:
+    """Unfitted preprocessor for models with native categorical support: numeric
+    columns pass through (missing values stay NaN) and the others become ordinal
+    codes, numeric first. Identifier columns are dropped."""
+    numeric_cols = X.select_dtypes(include='number').columns.tolist()
+    categorical_cols = [c for c in X.columns if c not in numeric_cols and c not in ID_COLUMNS]
+
+    categorical_transformer = Pipeline(steps=[
+        ('to_str', FunctionTransformer(_as_str, feature_names_out='one-to-one')),
+        ('ordinal', OrdinalEncoder(handle_unknown='use_encoded_value', unknown_value=np.nan,
+                                   encoded_missing_value=np.nan, max_categories=MAX_NATIVE_CATEGORIES,
+                                   dtype=np.float32))
+    ])
+
+    return ColumnTransformer(transformers=[
+        ('num', 'passthrough', numeric_cols),
+        ('cat', categorical_transformer, categorical_cols)
     ])
 
+
+@profiled
+def preprocess_ordinal(df: pd.DataFrame) -> Tuple[np.ndarray, ColumnTransformer, np.ndarray]:
+    """Dense ordinal features for native-categorical models, the fitted preprocessor
+    and the boolean mask of categorical output columns."""
+    X = df.drop(columns=['Churn'], errors='ignore')
+    preprocessor = build_ordinal_preprocessor(X)
+    X_processed = np.asarray(preprocessor.fit_transform(X), dtype=np.float32)
+    mask = np.zeros(X_processed.shape[1], dtype=bool)
+    mask[preprocessor.output_indices_['cat']] = True
+    return X_processed, preprocessor, mask
+
+
+@profiled
+def preprocess_data(df: pd.DataFrame, sparse: bool = False) -> Tuple[csr_matrix, np.ndarray, ColumnTransformer, LabelEncoder]:
+    """Preprocess data with pipelines; ``sparse`` gives a float32 CSR matrix (see ``build_preprocessor``)."""
+    X = df.drop('Churn', axis=1)
+    y = df['Churn']
+
+    preprocessor = build_preprocessor(X, sparse=sparse)
     X_processed = preprocessor.fit_transform(X)
+    if sparse:
+        X_processed = as_float32_csr(X_processed)
     le = LabelEncoder()
     y_encoded = le.fit_transform(y)
 
     return X_processed, y_encoded, preprocessor, le
+
+
+def _write_preprocessed(path, X_processed, y_encoded, preprocessor, le):
+    if issparse(X_processed):
+        save_npz(path / 'X.npz', X_processed.tocsr())
+    else:
+        np.save(path / 'X.npy', X_processed)
+    joblib.dump((y_encoded, preprocessor, le), path / 'objects.joblib')
+
+
+def _read_preprocessed(path):
+    X_processed = load_npz(path / 'X.npz') if (path / 'X.npz').exists() else np.load(path / 'X.npy')
+    y_encoded, preprocessor, le = joblib.load(path / 'objects.joblib')
+    return X_processed, y_encoded, preprocessor, le
+
+
+@profiled
+def preprocess_data_cached(df: pd.DataFrame, spill_to_disk: bool = True,
+                           sparse: bool = False) -> Tuple[csr_matrix, np.ndarray, ColumnTransformer, LabelEncoder]:
+    """Preprocess data once per ``frame_key`` and mode.
+
+    Hits are served from the shared store, held by the calling session; with
+    ``spill_to_disk`` misses also check, and fill, an on-disk store shared
+    across processes and restarts. The returned objects are shared (the
+    matrix and labels are read-only), so callers must not mutate them.
+    """
+    # Imported here so the scoring service can unpickle preprocessors without Streamlit.
+    from utils.store import shared
+
+    key = f"{frame_key(df)}-v{PREPROCESS_VERSION}-sk{sklearn.__version__}" + ('-sparse' if sparse else '')
+
+    def build():
+        result = _PREPROCESS_STORE.load(key, _read_preprocessed) if spill_to_disk else None
+        if result is None:
+            result = preprocess_data(df, sparse=sparse)
+            if spill_to_disk:
+                _PREPROCESS_STORE.save(key, lambda path: _write_preprocessed(path, *result))
+        return result
+
+    return shared(f"matrix:{key}", 'matrix', build)
@@ -0,0 +1,107 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from utils.cache import LRUCache, frame_fingerprint
+
+
+HIST_BINS = 30
+MAX_VALUE_COUNTS = 50
+MAX_OUTLIERS = 500
+
+_PROFILES = LRUCache(maxsize=8)
+
+
+@dataclass
+class EDAProfile:
+    """Everything the EDA page draws, computed once per dataset."""
+    fingerprint: str
+    n_rows: int
+    columns: List[str]
+    numeric_cols: List[str]
+    categorical_cols: List[str]
+    missing: pd.Series
+    describe: pd.DataFrame
+    quantiles: pd.DataFrame
+    histograms: Dict[str, tuple] = field(default_factory=dict)
+    value_counts: Dict[str, pd.Series] = field(default_factory=dict)
+    box_stats: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    marginal_box: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    corr: Optional[pd.DataFrame] = None
+    group_col: Optional[str] = None
+
+    @property
+    def shape(self) -> tuple:
+        return (self.n_rows, len(self.columns))
+
+
+def box_stats(values: np.ndarray, groups: np.ndarray, labels) -> pd.DataFrame:
+    """Quartiles, Tukey fences and a bounded outlier sample for each group."""
+    rows = []
+    rng = np.random.RandomState(42)
+    for code, label in enumerate(labels):
+        v = values[(groups == code) & ~np.isnan(values)]
+        if v.size == 0:
+            continue
+        q1, median, q3 = np.percentile(v, [25, 50, 75])
+        lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        inside = v[(v >= lo) & (v <= hi)]
+        outliers = v[(v < lo) | (v > hi)]
+        if outliers.size > MAX_OUTLIERS:
+            outliers = rng.choice(outliers, MAX_OUTLIERS, replace=False)
+        rows.append({
+            'group': label, 'q1': q1, 'median': median, 'q3': q3,
+            'lowerfence': inside.min() if inside.size else q1,
+            'upperfence': inside.max() if inside.size else q3,
+            'outliers': outliers, 'count': v.size
+        })
+    return pd.DataFrame(rows)
+
+
+def build_profile(df: pd.DataFrame, group_col: Optional[str] = 'Churn', fingerprint: Optional[str] = None) -> EDAProfile:
+    """Compute per-column counts, quantiles, histograms, value counts, missingness,
+    box-plot stats by ``group_col`` and the correlation matrix."""
+    numeric_cols = df.select_dtypes(include='number').columns.tolist()
+    categorical_cols = [c for c in df.columns if c not in numeric_cols]
+    block = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan) if numeric_cols else np.empty((len(df), 0))
+
+    profile = EDAProfile(
+        fingerprint=fingerprint or frame_fingerprint(df),
+        n_rows=len(df),
+        columns=[str(c) for c in df.columns],
+        numeric_cols=numeric_cols,
+        categorical_cols=categorical_cols,
+        missing=df.isnull().sum(),
+        describe=df.describe(include='all'),
+        quantiles=pd.DataFrame(np.nanpercentile(block, [0, 25, 50, 75, 100], axis=0).reshape(5, -1),
+                               index=[0, 0.25, 0.5, 0.75, 1], columns=numeric_cols),
+        corr=df[numeric_cols].corr() if numeric_cols else None,
+        group_col=group_col if group_col in df.columns else None
+    )
+    for i, col in enumerate(numeric_cols):
+        v = block[:, i][~np.isnan(block[:, i])]
+        profile.histograms[col] = np.histogram(v, bins=HIST_BINS) if v.size else (np.zeros(0), np.zeros(1))
+        profile.marginal_box[col] = box_stats(block[:, i], np.zeros(len(df), dtype=int), [col])
+    for col in categorical_cols:
+        profile.value_counts[col] = df[col].value_counts().head(MAX_VALUE_COUNTS)
+    if profile.group_col:
+        codes, labels = pd.factorize(df[profile.group_col], sort=True)
+        for i, col in enumerate(numeric_cols):
+            profile.box_stats[col] = box_stats(block[:, i], codes, labels)
+    return profile
+
+
+def get_profile(df: pd.DataFrame, group_col: Optional[str] = 'Churn') -> EDAProfile:
+    """Return the cached profile for ``df``, building it on first use.
+
+    Frames from ``load_data`` carry their fingerprint in ``attrs``, so a rerun
+    resolves the profile without scanning the frame. pandas copies ``attrs`` to
+    derived frames, so the shape and columns are part of the key too.
+    """
+    fingerprint = df.attrs.get('fingerprint') or frame_fingerprint(df)
+    key = (fingerprint, df.shape, tuple(df.columns), group_col)
+    profile = _PROFILES.get(key)
+    if profile is None:
+        profile = build_profile(df, group_col, fingerprint)
+        _PROFILES.put(key, profile)
+    return profile
@@ -0,0 +1,97 @@
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+import numpy as np
+import pandas as pd
+
+
+BATCH_CHUNK_SIZE = 50_000
+# Streamlit holds a download in memory, so predictions served from the app are capped.
+DOWNLOAD_MAX_BYTES = int(os.environ.get('TELCO_DOWNLOAD_MAX_MB', 200)) * 2 ** 20
+
+
+def iter_chunks(uploaded_file, chunk_size: int = BATCH_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Yield fixed-size frames from an uploaded CSV, Parquet or Excel file.
+
+    CSV and Parquet are streamed; Excel has no streaming reader, so it is read
+    once and sliced.
+    """
+    name = uploaded_file.name
+    if name.endswith('.csv'):
+        yield from pd.read_csv(uploaded_file, chunksize=chunk_size)
+    elif name.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(uploaded_file).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif name.endswith(('.xls', '.xlsx')):
+        df = pd.read_excel(uploaded_file)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        raise ValueError("Unsupported file format. Use CSV, Parquet or Excel.")
+
+
+def score_chunk(chunk: pd.DataFrame, preprocessor, model, le, predictor=None) -> pd.DataFrame:
+    """Transform one chunk with the fitted preprocessor and score it with a single model call.
+
+    ``predictor`` is an optional compiled equivalent of ``preprocessor`` + ``model``
+    (see ``models.fastpath``) used in their place.
+    """
+    chunk = chunk.drop(columns=['Churn'], errors='ignore')
+    if 'TotalCharges' in chunk:
+        chunk = chunk.assign(TotalCharges=pd.to_numeric(chunk['TotalCharges'], errors='coerce'))
+    out = pd.DataFrame(index=chunk.index)
+    if 'customerID' in chunk:
+        out['customerID'] = chunk['customerID'].values
+    if predictor is not None:
+        proba = predictor.predict_proba(chunk)
+        out['Prediction'] = le.inverse_transform(predictor.classes_[np.argmax(proba, axis=1)])
+        out['Churn_Probability'] = proba[:, 1].astype(np.float32)
+        return out
+    X = preprocessor.transform(chunk)
+    if hasattr(model, 'predict_proba'):
+        proba = model.predict_proba(X)
+        pred = model.classes_[np.argmax(proba, axis=1)]
+        out['Prediction'] = le.inverse_transform(pred)
+        out['Churn_Probability'] = proba[:, 1].astype(np.float32)
+    else:
+        out['Prediction'] = le.inverse_transform(model.predict(X))
+    return out
+
+
+def score_file(uploaded_file, preprocessor, model, le, out_path: Path, fmt: str = 'csv',
+               chunk_size: int = BATCH_CHUNK_SIZE, progress=None, predictor=None,
+               max_bytes: Optional[int] = None) -> Dict[str, float]:
+    """Score a whole file chunk by chunk, streaming results to ``out_path``.
+
+    Only one input chunk and its predictions are held in memory at a time.
+    ``progress`` is called with the running row count after each chunk. Once
+    ``out_path`` grows past ``max_bytes``, scoring stops with ``ValueError``.
+    """
+    start = time.perf_counter()
+    n_rows = 0
+    writer = None
+    try:
+        for i, chunk in enumerate(iter_chunks(uploaded_file, chunk_size)):
+            scored = score_chunk(chunk, preprocessor, model, le, predictor)
+            if fmt == 'parquet':
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(scored, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_path, table.schema)
+                writer.write_table(table)
+            else:
+                scored.to_csv(out_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            n_rows += len(scored)
+            if max_bytes is not None and out_path.stat().st_size > max_bytes:
+                raise ValueError(f"Predictions exceed the {max_bytes / 2 ** 20:,.0f} MB download limit after "
+                                 f"{n_rows:,} rows; score the file in parts or raise TELCO_DOWNLOAD_MAX_MB.")
+            if progress is not None:
+                progress(n_rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    seconds = time.perf_counter() - start
+    return {'rows': n_rows, 'seconds': seconds, 'rows_per_sec': n_rows / seconds if seconds else float('nan')}
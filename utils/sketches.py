@@ -0,0 +1,385 @@
+# Streaming EDA aggregates
+"""Mergeable per-dataset sketches behind the dashboard KPIs.
+
+A ``DatasetSketch`` holds, for every row it has seen:
+
+- row, labelled and churned counts;
+- Welford count/mean/variance/min/max per numeric column (``Moments``);
+- a merging t-digest per numeric column for quantiles (``QuantileSketch``);
+- customer, labelled and churned counts per level of each categorical column;
+- the same counts per month of tenure, for churn-over-tenure curves.
+
+Every part merges exactly (the t-digest approximately), so a new monthly
+batch is folded in by sketching the batch alone and merging. Sketches are
+persisted per dataset under ``CACHE_DIR/sketches``. For a CSV that grows by
+appending rows, ``csv_sketch`` parses only the bytes after the last offset it
+consumed. Reading the KPIs back costs the same whatever the number of rows.
+"""
+import hashlib
+import io
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+import joblib
+import numpy as np
+import pandas as pd
+from utils.cache import CACHE_DIR, LRUCache, frame_fingerprint
+from utils.data_loader import CHUNK_SIZE, stream_data
+from utils.kpis import COUNT_COLUMNS, MISSING_LEVEL, KPIFrame
+
+
+SKETCH_DIR = CACHE_DIR / 'sketches'
+TDIGEST_COMPRESSION = 200
+# Categorical columns with more levels (identifiers) are left out of the sketch.
+MAX_SKETCH_LEVELS = 1_000
+# Bytes hashed at the start of a CSV and just before the consumed offset to detect rewrites.
+CHECK_BYTES = 64 * 1024
+
+_SKETCHES = LRUCache(maxsize=16)
+_lock = threading.Lock()
+
+
+@dataclass
+class Moments:
+    """Count, mean, sum of squared deviations, min and max (Welford; Chan et al. to merge)."""
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    min: float = np.inf
+    max: float = -np.inf
+
+    @classmethod
+    def of(cls, values: np.ndarray) -> 'Moments':
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return cls()
+        mean = values.mean()
+        return cls(values.size, float(mean), float(((values - mean) ** 2).sum()), float(values.min()), float(values.max()))
+
+    def merge(self, other: 'Moments') -> 'Moments':
+        if not other.count:
+            return self
+        if not self.count:
+            return other
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        return Moments(count, self.mean + delta * other.count / count,
+                       self.m2 + other.m2 + delta ** 2 * self.count * other.count / count,
+                       min(self.min, other.min), max(self.max, other.max))
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else float('nan')
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+
+@dataclass
+class QuantileSketch:
+    """Merging t-digest: weighted centroids, small at the tails and larger in the middle.
+
+    Centroids are formed with the k1 scale function, so a digest keeps about
+    ``compression`` centroids whatever the number of values, and tail
+    quantiles stay accurate.
+    """
+    compression: int = TDIGEST_COMPRESSION
+    means: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    weights: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    min: float = np.inf
+    max: float = -np.inf
+
+    @classmethod
+    def of(cls, values: np.ndarray, compression: int = TDIGEST_COMPRESSION) -> 'QuantileSketch':
+        values = values[~np.isnan(values)].astype(np.float64)
+        if not values.size:
+            return cls(compression)
+        digest = cls(compression, min=float(values.min()), max=float(values.max()))
+        digest.means, digest.weights = digest._compress(values, np.ones(values.size))
+        return digest
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        # k1(q) = compression / (2 pi) * asin(2q - 1); one centroid per unit of k.
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        ids = np.floor(k - k[0]).astype(np.int64)
+        ids = np.unique(ids, return_inverse=True)[1]
+        merged_w = np.bincount(ids, weights)
+        return np.bincount(ids, weights * means) / merged_w, merged_w
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        if not other.weights.size:
+            return self
+        if not self.weights.size:
+            return other
+        digest = QuantileSketch(self.compression, min=min(self.min, other.min), max=max(self.max, other.max))
+        digest.means, digest.weights = digest._compress(np.concatenate([self.means, other.means]),
+                                                        np.concatenate([self.weights, other.weights]))
+        return digest
+
+    def quantile(self, q) -> np.ndarray:
+        if not self.weights.size:
+            return np.full(np.shape(q), np.nan)
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(np.asarray(q) * total, np.concatenate([[0], centers, [total]]),
+                         np.concatenate([[self.min], self.means, [self.max]]))
+
+
+def _add_counts(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
+    return a.add(b, fill_value=0).astype(np.int64)
+
+
+@dataclass
+class DatasetSketch:
+    """Mergeable aggregates of one dataset (see the module docstring)."""
+    dataset: str
+    n_rows: int = 0
+    n_labelled: int = 0
+    n_churned: int = 0
+    moments: Dict[str, Moments] = field(default_factory=dict)
+    quantiles: Dict[str, QuantileSketch] = field(default_factory=dict)
+    levels: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    tenure: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(
+        columns=COUNT_COLUMNS, index=pd.Index([], dtype=np.int64), dtype=np.int64))
+    skipped: Set[str] = field(default_factory=set)
+    batches: Set[str] = field(default_factory=set)
+    # For CSV-backed sketches: bytes consumed, the header line and check hashes.
+    source: Dict[str, object] = field(default_factory=dict)
+
+    @classmethod
+    def of(cls, df: pd.DataFrame, dataset: str = '') -> 'DatasetSketch':
+        """Sketch of one frame (a full dataset or a batch)."""
+        sketch = cls(dataset, n_rows=len(df))
+        kpis = KPIFrame(df)
+        sketch.n_labelled, sketch.n_churned = int(kpis.labelled.sum()), int(kpis.churned.sum())
+        for col in df.columns:
+            s = df[col]
+            if col == 'Churn':
+                continue
+            if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+                values = s.to_numpy(dtype=np.float64, na_value=np.nan)
+                sketch.moments[col] = Moments.of(values)
+                sketch.quantiles[col] = QuantileSketch.of(values)
+            elif s.nunique() > MAX_SKETCH_LEVELS:
+                sketch.skipped.add(col)
+            else:
+                counts = kpis.aggregate([col])[COUNT_COLUMNS]
+                counts.index = counts.index.astype(str)
+                sketch.levels[col] = counts
+        if 'tenure' in df:
+            months = pd.to_numeric(df['tenure'], errors='coerce')
+            if not pd.api.types.is_integer_dtype(months):
+                months = months.round().astype('Int64')
+            counts = KPIFrame(pd.DataFrame({'tenure': months}), kpis.churned, kpis.labelled).aggregate(['tenure'])
+            counts = counts[counts.index != MISSING_LEVEL][COUNT_COLUMNS]
+            counts.index = counts.index.astype(np.int64)
+            sketch.tenure = counts
+        return sketch
+
+    def merge(self, other: 'DatasetSketch') -> 'DatasetSketch':
+        """Aggregates of both sketches' rows; ``self``'s dataset and source are kept."""
+        merged = DatasetSketch(self.dataset, self.n_rows + other.n_rows, self.n_labelled + other.n_labelled,
+                               self.n_churned + other.n_churned, skipped=self.skipped | other.skipped,
+                               batches=self.batches | other.batches, source=dict(self.source))
+        for col in set(self.moments) | set(other.moments):
+            merged.moments[col] = self.moments.get(col, Moments()).merge(other.moments.get(col, Moments()))
+            merged.quantiles[col] = self.quantiles.get(col, QuantileSketch()).merge(
+                other.quantiles.get(col, QuantileSketch()))
+        empty = pd.DataFrame(columns=COUNT_COLUMNS, dtype=np.int64)
+        for col in (set(self.levels) | set(other.levels)) - merged.skipped:
+            counts = _add_counts(self.levels.get(col, empty), other.levels.get(col, empty))
+            if len(counts) > MAX_SKETCH_LEVELS:
+                merged.skipped.add(col)
+            else:
+                merged.levels[col] = counts
+        merged.tenure = _add_counts(self.tenure, other.tenure)
+        return merged
+
+    @property
+    def churn_rate(self) -> float:
+        return self.n_churned / self.n_labelled if self.n_labelled else float('nan')
+
+    def mean(self, col: str) -> float:
+        return self.moments[col].mean if col in self.moments and self.moments[col].count else float('nan')
+
+    def category_churn(self, col: str) -> pd.DataFrame:
+        """Customers, churned customers and churn rate per level of ``col``."""
+        counts = self.levels[col].copy()
+        counts['churn_rate'] = counts['churned'] / counts['labelled'].where(counts['labelled'] > 0)
+        return counts
+
+    def tenure_curve(self, bucket_months: int = 1) -> pd.DataFrame:
+        """Churn rate per tenure bucket of ``bucket_months`` months (``tenure`` is the bucket start)."""
+        counts = self.tenure.groupby((self.tenure.index // bucket_months) * bucket_months).sum()
+        counts['churn_rate'] = counts['churned'] / counts['labelled'].where(counts['labelled'] > 0)
+        return counts.rename_axis('tenure').reset_index()
+
+
+def _path(dataset: str) -> Path:
+    return SKETCH_DIR / f"{dataset}.joblib"
+
+
+def _load(dataset: str) -> Optional[DatasetSketch]:
+    sketch = _SKETCHES.get(dataset)
+    if sketch is None and _path(dataset).exists():
+        try:
+            sketch = joblib.load(_path(dataset))
+        except Exception:
+            return None
+        _SKETCHES.put(dataset, sketch)
+    return sketch
+
+
+def save_sketch(sketch: DatasetSketch):
+    """Persist ``sketch`` (atomically) and make it the cached one for its dataset."""
+    SKETCH_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _path(sketch.dataset).with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    joblib.dump(sketch, tmp)
+    os.replace(tmp, _path(sketch.dataset))
+    _SKETCHES.put(sketch.dataset, sketch)
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _read_range(path: Path, start: int, end: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(max(end - start, 0))
+
+
+def _unchanged(path: Path, source: Dict[str, object]) -> bool:
+    """Whether ``path`` still starts with the bytes the sketch consumed (spot-checked)."""
+    offset = source.get('offset', 0)
+    if not offset or path.stat().st_size < offset:
+        return False
+    return (_digest(_read_range(path, 0, min(CHECK_BYTES, offset))) == source['head']
+            and _digest(_read_range(path, max(offset - CHECK_BYTES, 0), offset)) == source['tail'])
+
+
+class _FileSlice(io.RawIOBase):
+    """Read-only view of ``path`` from byte ``start`` to ``end``."""
+
+    def __init__(self, path: Path, start: int, end: int):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._left = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._file.readinto(memoryview(buffer)[:max(min(len(buffer), self._left), 0)])
+        self._left -= n
+        return n
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _last_line_end(path: Path, start: int, size: int) -> int:
+    """Offset just past the last newline in ``path[start:size]`` (``start`` if there is none)."""
+    end = size
+    while end > start:
+        block = _read_range(path, max(end - CHECK_BYTES, start), end)
+        newline = block.rfind(b'\n')
+        if newline >= 0:
+            return end - len(block) + newline + 1
+        end -= len(block)
+    return start
+
+
+def _sketch_rows(path: Path, header: bytes, start: int, end: int, chunksize: int) -> DatasetSketch:
+    """Sketch of the rows in bytes ``start:end`` of ``path``, parsed one chunk at a time."""
+    sketch = DatasetSketch('')
+    names = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+    with io.BufferedReader(_FileSlice(path, start, end)) as rows:
+        for chunk in stream_data(rows, chunksize, names=names):
+            sketch = sketch.merge(DatasetSketch.of(chunk))
+    return sketch
+
+
+def csv_sketch(path, chunksize: int = CHUNK_SIZE) -> DatasetSketch:
+    """Sketch of a CSV file that grows by appended rows.
+
+    Only rows after the offset consumed last time are parsed, one chunk at a
+    time. A partly written last row waits for the next call. If the file was
+    rewritten rather than appended to, it is sketched from the start. The
+    parse runs outside the module lock; if another caller stored a newer
+    sketch meanwhile, the new rows are parsed again from that one.
+    """
+    path = Path(path).resolve()
+    dataset = f"csv-{_digest(str(path).encode())}"
+    while True:
+        with _lock:
+            base = _load(dataset)
+        size = path.stat().st_size
+        rewritten = base is None or not _unchanged(path, base.source)
+        if not rewritten and base.source.get('offset') == size:
+            return base
+        if rewritten:
+            with open(path, 'rb') as f:
+                header = f.readline()
+            offset = len(header)
+        else:
+            header, offset = base.source['header'], base.source['offset']
+        end = _last_line_end(path, offset, size)
+        rows = _sketch_rows(path, header, offset, end, chunksize) if end > offset else DatasetSketch('')
+        with _lock:
+            current = _load(dataset)
+            # Batches appended meanwhile keep the source, so they are kept.
+            if (current and current.source) != (base and base.source):
+                continue
+            sketch = (DatasetSketch(dataset) if rewritten else current).merge(rows)
+            sketch.source = {'offset': end, 'header': header,
+                             'head': _digest(_read_range(path, 0, min(CHECK_BYTES, end))),
+                             'tail': _digest(_read_range(path, max(end - CHECK_BYTES, 0), end))}
+            save_sketch(sketch)
+            return sketch
+
+
+def frame_sketch(df: pd.DataFrame, dataset: Optional[str] = None) -> DatasetSketch:
+    """Sketch of an in-memory dataset, built once per ``dataset`` id (default: its content fingerprint)."""
+    dataset = dataset or f"frame-{df.attrs.get('fingerprint') or frame_fingerprint(df)}"
+    with _lock:
+        sketch = _load(dataset)
+    if sketch is not None:
+        return sketch
+    built = DatasetSketch.of(df, dataset)
+    with _lock:
+        sketch = _load(dataset)
+        if sketch is None:
+            save_sketch(built)
+            sketch = built
+        return sketch
+
+
+def with_batch(sketch: DatasetSketch, batch: pd.DataFrame, batch_id: Optional[str] = None) -> DatasetSketch:
+    """``sketch`` with ``batch`` folded in, without persisting it; a batch already folded in is skipped."""
+    batch_id = batch_id or frame_fingerprint(batch)
+    if batch_id in sketch.batches:
+        return sketch
+    merged = sketch.merge(DatasetSketch.of(batch))
+    merged.batches.add(batch_id)
+    return merged
+
+
+def append_batch(sketch: DatasetSketch, batch: pd.DataFrame, batch_id: Optional[str] = None) -> DatasetSketch:
+    """Fold ``batch`` into the persisted sketch for every session; a batch already folded in is skipped.
+
+    Batches are recognised by id only: rows committed here and later appended
+    to the dataset's CSV are counted twice.
+    """
+    with _lock:
+        updated = with_batch(_load(sketch.dataset) or sketch, batch, batch_id)
+        save_sketch(updated)
+        return updated
@@ -0,0 +1,119 @@
+# Sparse matrix helpers
+"""Keep one-hot feature matrices sparse and catch code that densifies them.
+
+``densify_guard`` wraps ``toarray`` on every SciPy sparse class (``todense``
+and ``.A`` go through it). Inside the block, converting a matrix whose dense
+form is more than ``ratio`` times its sparse size, and at least ``min_mb``, is
+logged and warned about, or raised as a ``TypeError`` with ``action='raise'``.
+Small or already-dense conversions (a single prediction row, a random
+projection's output) pass. The guard is per thread; other sessions are not
+affected.
+"""
+import functools
+import logging
+import os
+import threading
+import traceback
+import warnings
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+import numpy as np
+import scipy.sparse as sp
+
+
+logger = logging.getLogger(__name__)
+
+# 'warn' or 'raise'; the action sparse-native training uses.
+DENSIFY_ACTION = os.environ.get('TELCO_DENSIFY', 'warn')
+DENSIFY_RATIO = 4.0
+DENSIFY_MIN_MB = 1.0
+
+_state = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+def as_float32_csr(X) -> sp.csr_matrix:
+    """``X`` as a float32 CSR matrix, without copying one that already is."""
+    if sp.issparse(X) and X.format == 'csr' and X.dtype == np.float32:
+        return X
+    return sp.csr_matrix(X, dtype=np.float32)
+
+
+def matrix_nbytes(X) -> int:
+    """Bytes held by a dense array or by the buffers of a sparse matrix."""
+    if sp.issparse(X):
+        return sum(getattr(X, a).nbytes for a in ('data', 'indices', 'indptr', 'row', 'col', 'offsets')
+                   if isinstance(getattr(X, a, None), np.ndarray))
+    return np.asarray(X).nbytes
+
+
+def dense_nbytes(X) -> int:
+    """Bytes ``X`` would take as a dense array."""
+    return int(np.prod(X.shape, dtype=np.int64)) * X.dtype.itemsize
+
+
+def _check(X):
+    dense, sparse = dense_nbytes(X), max(matrix_nbytes(X), 1)
+    if dense < _state.min_bytes or dense <= _state.ratio * sparse:
+        return
+    frame = next((f for f in reversed(traceback.extract_stack()[:-2])
+                  if 'scipy' not in f.filename and f.filename != __file__), None)
+    where = f"{frame.filename}:{frame.lineno} ({frame.name})" if frame else "unknown caller"
+    message = (f"Densifying a {X.shape[0]}x{X.shape[1]} sparse matrix ({sparse / 2 ** 20:.1f} MB) "
+               f"into {dense / 2 ** 20:.1f} MB at {where}.")
+    _state.events.append({'shape': X.shape, 'sparse_mb': sparse / 2 ** 20, 'dense_mb': dense / 2 ** 20,
+                          'where': where})
+    if _state.action == 'raise':
+        raise TypeError(message)
+    logger.warning(message)
+    warnings.warn(message, RuntimeWarning, stacklevel=3)
+
+
+def _guarded(toarray):
+    @functools.wraps(toarray)
+    def wrapper(self, *args, **kwargs):
+        if getattr(_state, 'action', None) is not None and not getattr(_state, 'busy', False):
+            _state.busy = True
+            try:
+                _check(self)
+            finally:
+                _state.busy = False
+        return toarray(self, *args, **kwargs)
+
+    wrapper._densify_guarded = True
+    return wrapper
+
+
+def _install():
+    """Wrap ``toarray`` once on every sparse class that defines it."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        bases = (sp.spmatrix, getattr(sp, 'sparray', sp.spmatrix))
+        formats = [f for f in map(functools.partial(getattr, sp), dir(sp)) if isinstance(f, type) and issubclass(f, bases)]
+        for cls in {c for f in formats for c in f.__mro__ if 'toarray' in vars(c)}:
+            if not getattr(cls.toarray, '_densify_guarded', False):
+                cls.toarray = _guarded(cls.toarray)
+        _installed = True
+
+
+@contextmanager
+def densify_guard(action: str = 'warn', ratio: float = DENSIFY_RATIO,
+                  min_mb: float = DENSIFY_MIN_MB) -> Iterator[List[Dict[str, Any]]]:
+    """Report sparse-to-dense conversions made in this thread inside the block.
+
+    Yields the list of recorded conversions (``shape``, ``sparse_mb``,
+    ``dense_mb``, ``where``). ``action`` is ``'warn'`` or ``'raise'``.
+    """
+    if action not in ('warn', 'raise'):
+        raise ValueError(f"Unknown densify action '{action}'.")
+    _install()
+    saved = {k: getattr(_state, k, None) for k in ('action', 'ratio', 'min_bytes', 'events')}
+    _state.action, _state.ratio, _state.min_bytes, _state.events = action, ratio, min_mb * 2 ** 20, []
+    try:
+        yield _state.events
+    finally:
+        for k, v in saved.items():
+            setattr(_state, k, v)
@@ -0,0 +1,240 @@
+# Shared object store
+"""One process-wide store of large read-only objects, shared by every session.
+
+Frames, processed matrices and fitted models are keyed by content
+fingerprints, so 30 sessions on the same dataset hold one copy between them.
+Sessions keep lightweight ``Handle`` objects in ``st.session_state``. A
+handle pins its entry until it is released or garbage-collected with its
+session. Entries nobody holds are evicted least-recently-used first once the
+store is over ``STORE_MAX_BYTES``. Entries in use are never evicted, so the
+store can run over budget while they are held.
+
+Stored objects are shared, never copied. Callers must not mutate them. NumPy
+and SciPy sparse buffers are made read-only to catch accidental writes.
+"""
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import streamlit as st
+from scipy.sparse import issparse
+
+
+STORE_MAX_BYTES = int(os.environ.get('TELCO_STORE_MB', 4096)) * 2 ** 20
+SESSION_KEY = 'store_handles'
+# Handles a session keeps; older ones are released (their entries stay cached).
+SESSION_MAX_HANDLES = 8
+
+
+def nbytes(obj, _seen: Optional[Dict[int, Any]] = None) -> int:
+    """Approximate memory held by ``obj``: arrays, frames, sparse matrices and
+    the containers and estimators holding them. Extension types without a
+    ``__dict__`` (e.g. fitted sklearn trees) are measured through ``__getstate__``."""
+    _seen = {} if _seen is None else _seen
+    if id(obj) in _seen:
+        return 0
+    # Keeps ``__getstate__`` temporaries alive so their ids are not reused mid-walk.
+    _seen[id(obj)] = obj
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        # Memory-mapped arrays (registry models) live in the page cache, not the heap.
+        if isinstance(obj, np.memmap):
+            return 0
+        # Views count their base array; arrays over foreign buffers (e.g. tree nodes) own that memory.
+        return nbytes(obj.base, _seen) if isinstance(obj.base, np.ndarray) else obj.nbytes
+    if issparse(obj):
+        return sum(nbytes(getattr(obj, a), _seen) for a in ('data', 'indices', 'indptr') if hasattr(obj, a))
+    if isinstance(obj, (list, tuple, set)):
+        return sum(nbytes(v, _seen) for v in obj)
+    if isinstance(obj, dict):
+        return sum(nbytes(v, _seen) for v in obj.values())
+    if isinstance(obj, (str, bytes, int, float, bool, type)) or obj is None:
+        return len(obj) if isinstance(obj, bytes) else 0
+    try:
+        state = vars(obj) if hasattr(obj, '__dict__') else obj.__getstate__()
+    except (AttributeError, TypeError):
+        return 0
+    return sum(nbytes(v, _seen) for v in state.values()) if isinstance(state, dict) else 0
+
+
+def _freeze(obj):
+    """Make NumPy and sparse buffers read-only (frames and estimators are left as they are)."""
+    if isinstance(obj, np.ndarray) and obj.flags.owndata:
+        obj.setflags(write=False)
+    elif issparse(obj):
+        for a in ('data', 'indices', 'indptr'):
+            if isinstance(getattr(obj, a, None), np.ndarray):
+                getattr(obj, a).setflags(write=False)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            _freeze(v)
+
+
+class Handle:
+    """A session's reference to one store entry. Releasing it (or losing it with
+    the session) lets the entry be evicted."""
+
+    __slots__ = ('key', 'kind', 'value', '_release', '__weakref__')
+
+    def __init__(self, store: 'SharedStore', key: str, kind: str, value: Any):
+        self.key, self.kind, self.value = key, kind, value
+        self._release = weakref.finalize(self, store._release, key)
+
+    def release(self):
+        self._release()
+
+
+class SharedStore:
+    """Thread-safe, reference-counted LRU store with byte accounting."""
+
+    def __init__(self, max_bytes: int = STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        # Per-key locks so concurrent sessions build an entry once.
+        self._building: Dict[str, threading.Lock] = {}
+        self.hits = self.misses = self.evictions = 0
+
+    def acquire(self, key: str, kind: str, factory: Callable[[], Any]) -> Optional[Handle]:
+        """Handle on ``key``, building the value with ``factory`` on a miss.
+
+        A ``None`` from ``factory`` (e.g. a failed load) is not stored and gives ``None``.
+        """
+        handle = self._checkout(key)
+        if handle is not None:
+            return handle
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            handle = self._checkout(key)
+            if handle is not None:
+                return handle
+            value = factory()
+            if value is None:
+                return None
+            self.put(key, kind, value)
+            return self._checkout(key, count=False)
+
+    def put(self, key: str, kind: str, value: Any):
+        """Store ``value`` (replacing any entry under ``key``) without taking a handle."""
+        _freeze(value)
+        with self._lock:
+            old = self._entries.get(key)
+            self._entries[key] = {'kind': kind, 'value': value, 'bytes': nbytes(value),
+                                  'refs': old['refs'] if old else 0, 'created': time.time(),
+                                  'last_used': time.time(), 'hits': 0}
+            self.misses += 1
+            self._evict()
+
+    def _checkout(self, key: str, count: bool = True) -> Optional[Handle]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            entry['refs'] += 1
+            entry['last_used'] = time.time()
+            if count:
+                entry['hits'] += 1
+                self.hits += 1
+            return Handle(self, key, entry['kind'], entry['value'])
+
+    def _release(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['refs'] = max(entry['refs'] - 1, 0)
+            self._evict()
+
+    def _evict(self):
+        total = sum(e['bytes'] for e in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry['refs'] == 0:
+                total -= entry['bytes']
+                del self._entries[key]
+                self._building.pop(key, None)
+                self.evictions += 1
+
+    def refresh(self, key: str):
+        """Re-measure ``key`` after its value grew in place (e.g. a lazily loaded model)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['bytes'] = nbytes(entry['value'])
+            self._evict()
+
+    def clear(self, kind: Optional[str] = None):
+        """Drop unreferenced entries (of ``kind``, if given); held ones stay."""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry['refs'] == 0 and kind in (None, entry['kind']):
+                    del self._entries[key]
+                    self._building.pop(key, None)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e['bytes'] for e in self._entries.values())
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'key': key, 'kind': e['kind'], 'mb': e['bytes'] / 2 ** 20, 'refs': e['refs'],
+                     'hits': e['hits'], 'idle_s': time.time() - e['last_used']}
+                    for key, e in reversed(list(self._entries.items()))]
+
+
+@st.cache_resource(show_spinner=False)
+def get_store() -> SharedStore:
+    """The process-wide store; ``st.cache_resource`` makes it a singleton shared by all sessions."""
+    return SharedStore()
+
+
+def hold(handle: Optional[Handle]) -> Optional[Handle]:
+    """Keep ``handle`` in the current session (no-op outside a Streamlit script run)."""
+    if handle is None:
+        return None
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        if get_script_run_ctx(suppress_warning=True) is None:
+            return handle
+    except ImportError:
+        return handle
+    handles = st.session_state.setdefault(SESSION_KEY, OrderedDict())
+    previous = handles.pop(handle.key, None)
+    handles[handle.key] = handle
+    if previous is not None and previous is not handle:
+        previous.release()
+    while len(handles) > SESSION_MAX_HANDLES:
+        handles.popitem(last=False)[1].release()
+    return handle
+
+
+def shared(key: str, kind: str, factory: Callable[[], Any]) -> Any:
+    """The shared value for ``key`` (built by ``factory`` on a miss), held by the current session."""
+    handle = hold(get_store().acquire(key, kind, factory))
+    return None if handle is None else handle.value
+
+
+def show_store_panel():
+    """Sidebar panel: store size against its budget, per-kind totals and entries."""
+    store = get_store()
+    stats = store.stats()
+    st.subheader("Shared Store")
+    st.progress(min(store.total_bytes() / store.max_bytes, 1.0),
+                text=f"{store.total_bytes() / 2 ** 20:,.1f} MB of {store.max_bytes / 2 ** 20:,.0f} MB")
+    st.caption(f"{store.hits} hits · {store.misses} builds · {store.evictions} evictions · "
+               f"{len(st.session_state.get(SESSION_KEY, {}))} handles in this session")
+    if not stats:
+        return
+    frame = pd.DataFrame(stats)
+    st.dataframe(frame.groupby('kind').agg(entries=('key', 'count'), mb=('mb', 'sum'), refs=('refs', 'sum')).round(1))
+    st.dataframe(frame.assign(key=frame['key'].str.slice(0, 40)).round(1), hide_index=True)
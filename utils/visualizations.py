@@ -1,64 +1,202 @@
-from typing import Optional
+from typing import Optional, Union
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import numpy as np
-from sklearn.metrics import confusion_matrix, classification_report, mean_squared_error, r2_score
-
-
-def plot_histogram(df: pd.DataFrame, column: str, title: Optional[str] = None):
-    fig = px.histogram(df, x=column, marginal="box", nbins=30, title=title or f"{column} Distribution")
+from utils.profile import EDAProfile, HIST_BINS, box_stats
+from utils.sketches import DatasetSketch
+from utils.instrumentation import profiled, profile_span
+
+# Plot helpers take either a raw DataFrame or a precomputed EDAProfile.
+Data = Union[pd.DataFrame, EDAProfile]
+
+# Above this many rows, raw-frame plots are aggregated or sampled server-side
+# so the JSON sent to the browser stays bounded.
+MAX_PLOT_ROWS = 20_000
+
+
+def _show(fig: go.Figure):
+    # Timed on its own so figure building and Plotly serialization show up separately.
+    with profile_span('st.plotly_chart', 'plotly'):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+def sample_rows(df: pd.DataFrame, max_rows: int = MAX_PLOT_ROWS, seed: int = 42) -> pd.DataFrame:
+    """Uniform row sample of at most ``max_rows``, in original row order."""
+    if len(df) <= max_rows:
+        return df
+    idx = np.sort(np.random.RandomState(seed).choice(len(df), max_rows, replace=False))
+    return df.iloc[idx]
+
+
+def _values(series: pd.Series) -> np.ndarray:
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _box_traces(stats: pd.DataFrame, horizontal: bool = False) -> list:
+    """Plotly box traces drawn from precomputed quartiles, fences and outliers."""
+    traces = []
+    for row in stats.itertuples():
+        label = str(row.group)
+        pos = {'y': [label]} if horizontal else {'x': [label]}
+        traces.append(go.Box(name=label, q1=[row.q1], median=[row.median], q3=[row.q3],
+                             lowerfence=[row.lowerfence], upperfence=[row.upperfence],
+                             orientation='h' if horizontal else 'v', boxpoints=False, **pos))
+        if len(row.outliers):
+            points = {'x': row.outliers, 'y': [label] * len(row.outliers)} if horizontal else \
+                {'x': [label] * len(row.outliers), 'y': row.outliers}
+            traces.append(go.Scatter(mode='markers', marker=dict(size=4), showlegend=False, name=label, **points))
+    return traces
+
+
+def _binned_histogram(counts: np.ndarray, edges: np.ndarray, marginal: pd.DataFrame, column: str, title: str) -> go.Figure:
+    """Histogram with a box marginal, drawn from bin counts instead of raw values."""
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.02)
+    for trace in _box_traces(marginal, horizontal=True):
+        fig.add_trace(trace, row=1, col=1)
+    fig.add_trace(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), name=column), row=2, col=1)
+    fig.update_layout(title=title, showlegend=False, bargap=0)
+    return fig
+
+
+@profiled
+def plot_histogram(data: Data, column: str, title: Optional[str] = None):
+    title = title or f"{column} Distribution"
+    if isinstance(data, EDAProfile):
+        fig = _binned_histogram(*data.histograms[column], data.marginal_box[column], column, title)
+    elif len(data) > MAX_PLOT_ROWS:
+        values = _values(data[column])
+        values = values[~np.isnan(values)]
+        counts, edges = np.histogram(values, bins=HIST_BINS)
+        fig = _binned_histogram(counts, edges, box_stats(values, np.zeros(len(values), dtype=int), [column]), column, title)
+    else:
+        fig = px.histogram(data, x=column, marginal="box", nbins=30, title=title)
     fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
-
-
-def plot_boxplot(df: pd.DataFrame, x: str, y: str, title: Optional[str] = None):
-    fig = px.box(df, x=x, y=y, color=x, title=title or f"{y} by {x}")
+    _show(fig)
+
+
+@profiled
+def plot_boxplot(data: Data, x: str, y: str, title: Optional[str] = None):
+    title = title or f"{y} by {x}"
+    if isinstance(data, EDAProfile) and data.group_col == x:
+        fig = go.Figure(_box_traces(data.box_stats[y]))
+        fig.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+    elif not isinstance(data, EDAProfile) and len(data) > MAX_PLOT_ROWS:
+        codes, labels = pd.factorize(data[x], sort=True)
+        fig = go.Figure(_box_traces(box_stats(_values(data[y]), codes, labels)))
+        fig.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+    else:
+        fig = px.box(data, x=x, y=y, color=x, title=title)
     fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)
 
 
-def plot_correlation_heatmap(df: pd.DataFrame, columns: list, title: str = "Correlation Heatmap"):
-    corr = df[columns].corr(numeric_only=True)
+@profiled
+def plot_correlation_heatmap(data: Data, columns: list, title: str = "Correlation Heatmap"):
+    if isinstance(data, EDAProfile):
+        corr = data.corr.loc[columns, columns]
+    else:
+        corr = data[columns].corr(numeric_only=True)
     fig = px.imshow(corr, text_auto=True, aspect="auto", title=title)
     fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)
 
 
-def plot_pairplot(df: pd.DataFrame, columns: list, color_col: str):
-    fig = px.scatter_matrix(df[columns + [color_col]], dimensions=columns, color=color_col, height=800)
+@profiled
+def plot_pairplot(df: pd.DataFrame, columns: list, color_col: str, max_rows: int = MAX_PLOT_ROWS // 4):
+    sample = sample_rows(df[columns + [color_col]], max_rows)
+    title = f"Sample of {len(sample):,} / {len(df):,} rows" if len(sample) < len(df) else None
+    fig = px.scatter_matrix(sample, dimensions=columns, color=color_col, height=800, title=title)
+    fig.update_layout(title_x=0.5)
+    _show(fig)
+
+
+@profiled
+def plot_scatter(df: pd.DataFrame, x: str, y: str, color: Optional[str] = None, hover_data: Optional[list] = None,
+                 title: Optional[str] = None, mode: str = 'sample', bins: int = 100):
+    """Scatter plot that stays bounded on large frames.
+
+    Above ``MAX_PLOT_ROWS`` rows, ``mode='sample'`` draws a uniform row sample
+    and ``mode='density'`` draws a NumPy 2-D histogram heatmap instead of points.
+    """
+    title = title or f"{y} vs. {x}"
+    if len(df) > MAX_PLOT_ROWS and mode == 'density':
+        xs, ys = _values(df[x]), _values(df[y])
+        ok = ~(np.isnan(xs) | np.isnan(ys))
+        counts, x_edges, y_edges = np.histogram2d(xs[ok], ys[ok], bins=bins)
+        fig = go.Figure(go.Heatmap(x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+                                   z=np.where(counts > 0, counts, np.nan).T, colorscale='Viridis',
+                                   colorbar=dict(title='Customers')))
+        fig.update_layout(title=f"{title} (density of {len(df):,} rows)", xaxis_title=x, yaxis_title=y)
+    else:
+        columns = list(dict.fromkeys([x, y] + ([color] if color else []) + (hover_data or [])))
+        sample = sample_rows(df[columns])
+        if len(sample) < len(df):
+            title = f"{title} (sample of {len(sample):,} / {len(df):,} rows)"
+        fig = px.scatter(sample, x=x, y=y, color=color, hover_data=hover_data, title=title)
     fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)
 
 
-def plot_churn_distribution(df: pd.DataFrame):
-    fig = px.pie(df, names='Churn', title='Churn Distribution')
+@profiled
+def plot_churn_distribution(data: Data):
+    if isinstance(data, EDAProfile):
+        counts = data.value_counts['Churn']
+    else:
+        counts = data['Churn'].value_counts()
+    fig = px.pie(names=counts.index.astype(str), values=counts.values, title='Churn Distribution')
     fig.update_traces(textposition='inside', textinfo='percent+label')
     fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)
+
+
+@profiled
+def plot_churn_by_category(sketch: DatasetSketch, column: str, title: Optional[str] = None):
+    """Churn rate per level of ``column``, from a dataset sketch."""
+    rates = sketch.category_churn(column).rename_axis(column).reset_index()
+    fig = px.bar(rates, x=column, y='churn_rate', hover_data=['customers', 'churned'],
+                 labels={'churn_rate': 'Churn Rate'}, title=title or f"Churn Rate by {column}")
+    fig.update_layout(title_x=0.5, yaxis_tickformat='.0%')
+    _show(fig)
+
+
+@profiled
+def plot_churn_over_tenure(sketch: DatasetSketch, bucket_months: int = 1, title: str = "Churn Rate Over Tenure"):
+    """Churn rate per tenure bucket, from a dataset sketch."""
+    curve = sketch.tenure_curve(bucket_months)
+    fig = px.line(curve, x='tenure', y='churn_rate', hover_data=['customers', 'churned'],
+                  labels={'tenure': 'Tenure (months)', 'churn_rate': 'Churn Rate'}, title=title)
+    fig.update_layout(title_x=0.5, yaxis_tickformat='.0%')
+    _show(fig)
 
 
-def plot_missing_values(df: pd.DataFrame):
-    missing = df.isnull().sum()
+@profiled
+def plot_missing_values(data: Data):
+    missing = data.missing if isinstance(data, EDAProfile) else data.isnull().sum()
     missing = missing[missing > 0].sort_values(ascending=False)
     if missing.empty:
         st.success("No missing values found.")
         return
     fig = px.bar(x=missing.index, y=missing.values, labels={'x': 'Column', 'y': 'Missing Count'}, title='Missing Values by Column')
     fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)
 
 
+@profiled
 def plot_confusion_matrix(y_true, y_pred, labels: list = None):
+    # Imported here so the EDA page does not pay for sklearn.metrics.
+    from sklearn.metrics import confusion_matrix
     cm = confusion_matrix(y_true, y_pred)
     fig = px.imshow(cm, text_auto=True, labels=dict(x="Predicted", y="Actual"), x=labels, y=labels, title="Confusion Matrix")
     fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)
 
 
+@profiled
 def plot_feature_importance(importance: np.ndarray, feature_names: list, title: str = "Feature Importance"):
     df_imp = pd.DataFrame({'Feature': feature_names, 'Importance': importance}).sort_values('Importance', ascending=True)
     fig = px.bar(df_imp, x='Importance', y='Feature', orientation='h', title=title)
     fig.update_layout(title_x=0.5)
-    st.plotly_chart(fig, use_container_width=True)
+    _show(fig)